@@ -1,19 +1,87 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import BackgroundTasks, FastAPI, Header, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import iterate_in_threadpool, run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
-from pydantic import BaseModel
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from pydantic import BaseModel, Field, ValidationError
 import os
+import asyncio
+import base64
+import json
+import re
+import hashlib
 import requests
+import time
 from murf import Murf
 import tempfile
+from urllib.parse import quote
 from dotenv import load_dotenv
-from typing import Optional
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Dict, List, Literal, Optional
+from audio_store import AudioStore
+from caching import CachingMiddleware
+from scheduler import GenerationScheduler, parse_weights
+from history import GenerationHistory, hash_tenant, hash_text
+from lexicon import Lexicon
+from audio_pipeline import ffmpeg_available, render_to_temp, strip_mp3_headers
+from synthesis import LocalBackend, MurfBackend, SynthesisError, SynthesisRouter
+from limits import BodyLimitMiddleware, chunk_text
+from tracing import configure_tracing, shutdown_tracing, tracer
+from profiling import ProfilingMiddleware, is_admin, profile_process, profiled
+from usage import GROUP_COLUMNS, UsageLedger
+from lifecycle import DrainMiddleware, Lifecycle
 
 # Load environment variables
 load_dotenv()
 
+# Tracing: spans are only exported when OTEL_EXPORTER_OTLP_ENDPOINT or TRACE_FILE is set
+configure_tracing(os.getenv('OTEL_SERVICE_NAME', 'murf-voice-backend'))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Startup recovery and graceful shutdown; the objects used are defined further down"""
+    clear_temp_files()
+    recovery = asyncio.create_task(recover_undelivered())
+    yield
+    
+    # Stop admitting work, let running generations finish, then persist state
+    lifecycle.start_draining()
+    recovery.cancel()
+    if not await lifecycle.drain(SHUTDOWN_DRAIN_SECONDS):
+        print(f"Shutdown: gave up waiting for in-flight work: {lifecycle.stats()}")
+        # Nothing may touch the databases once they are closed below
+        cancelled = await lifecycle.cancel(SHUTDOWN_CANCEL_SECONDS)
+        print(f"Shutdown: cancelled {cancelled} unfinished generations")
+    audio_store.flush()
+    history.close()
+    usage.close()
+    shutdown_tracing()
+    clear_temp_files()
+
 # Initialize FastAPI app
-app = FastAPI(title="MurfAI Text-to-Speech API", version="1.0.0")
+app = FastAPI(title="MurfAI Text-to-Speech API", version="1.0.0", lifespan=lifespan)
+
+# HTTP caching: generated audio is content-addressed and never changes, the
+# voice catalog is static per deploy but revalidated so updates show up quickly
+CACHE_POLICIES = [
+    ('/api/audio/*', 'public, max-age=31536000, immutable'),
+    ('/api/voices', 'public, max-age=300, must-revalidate'),
+    ('/', 'public, max-age=60, must-revalidate'),
+]
+app.add_middleware(CachingMiddleware, policies=CACHE_POLICIES)
+
+# Input limits: request bodies are capped while they stream in, texts are capped
+# per request, and long texts are split into several translate/synthesize calls
+MAX_BODY_BYTES = int(os.getenv('MAX_BODY_BYTES', 256 * 1024))
+MAX_TEXT_CHARS = int(os.getenv('MAX_TEXT_CHARS', 20000))
+SYNTH_CHUNK_CHARS = int(os.getenv('SYNTH_CHUNK_CHARS', 2500))
+TRANSLATE_CHUNK_CHARS = int(os.getenv('TRANSLATE_CHUNK_CHARS', 2500))
+app.add_middleware(BodyLimitMiddleware, max_body_bytes=MAX_BODY_BYTES)
+
+# Audio response mode: the translated text rides in a header only while it fits
+# in this many bytes percent-encoded; longer ones are left to /api/history
+TEXT_HEADER_MAX_BYTES = int(os.getenv('TEXT_HEADER_MAX_BYTES', 2048))
 
 # Add CORS middleware
 app.add_middleware(
@@ -24,6 +92,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Profiling: admin-only, disabled unless ADMIN_TOKEN is set. Single /api/generate
+# calls can be profiled with "X-Profile: 1"; their results are kept in memory
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+PROFILE_MAX_SECONDS = float(os.getenv('PROFILE_MAX_SECONDS', 60))
+PROFILE_INTERVAL_MS = float(os.getenv('PROFILE_INTERVAL_MS', 5))
+request_profiles: "OrderedDict[str, str]" = OrderedDict()
+app.add_middleware(
+    ProfilingMiddleware,
+    paths=['/api/generate'],
+    admin_token=ADMIN_TOKEN,
+    profiles=request_profiles,
+    max_profiles=int(os.getenv('PROFILE_KEEP', 20)),
+    interval=PROFILE_INTERVAL_MS / 1000
+)
+
+# Graceful shutdown: once draining starts new requests get 503, and in-flight
+# requests and generations get up to SHUTDOWN_DRAIN_SECONDS to finish
+SHUTDOWN_DRAIN_SECONDS = float(os.getenv('SHUTDOWN_DRAIN_SECONDS', 20))
+# Generations still running after that are cancelled, and get this long to stop
+SHUTDOWN_CANCEL_SECONDS = float(os.getenv('SHUTDOWN_CANCEL_SECONDS', 3))
+lifecycle = Lifecycle()
+app.add_middleware(DrainMiddleware, lifecycle=lifecycle)
+
 # Initialize Murf client
 API_KEY = os.getenv('MURF_API_KEY')  # Add your Murf API key to .env file
 if not API_KEY:
@@ -31,14 +122,108 @@ if not API_KEY:
 
 client = Murf(api_key=API_KEY)
 
+# Speech synthesis backends in order of preference; "local" is a degraded-mode
+# CPU engine used when Murf is failing, too slow or over the cost cap
+SYNTH_BACKEND_FACTORIES = {
+    'murf': lambda: MurfBackend(client, cost_per_char=float(os.getenv('MURF_COST_PER_CHAR', 1.0))),
+    'local': LocalBackend,
+}
+synthesis_router = SynthesisRouter(
+    [SYNTH_BACKEND_FACTORIES[name.strip()]() for name in os.getenv('SYNTH_BACKENDS', 'murf,local').split(',')],
+    failure_threshold=int(os.getenv('SYNTH_FAILURE_THRESHOLD', 3)),
+    cooldown_seconds=float(os.getenv('SYNTH_COOLDOWN_SECONDS', 30)),
+    max_cost=float(os.environ['SYNTH_MAX_COST']) if os.getenv('SYNTH_MAX_COST') else None
+)
+
+# Local storage for generated audio
+DATA_DIR = os.getenv('DATA_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data'))
+AUDIO_CACHE_MAX_MB = int(os.getenv('AUDIO_CACHE_MAX_MB', 512))
+audio_store = AudioStore(os.path.join(DATA_DIR, 'audio'), AUDIO_CACHE_MAX_MB * 1024 * 1024)
+AUDIO_ID_PATTERN = re.compile(r'[0-9a-f]{32}')
+AUDIO_CHUNK_SIZE = 64 * 1024
+# /api/audio/process: longest total input it will decode. Jobs run in the
+# scheduler's batch class, so they queue behind its concurrency cap.
+AUDIO_PROCESS_MAX_SECONDS = float(os.getenv('AUDIO_PROCESS_MAX_SECONDS', 600))
+
+# Temp files handed out by /api/download; removed after sending, and stale leftovers swept on startup/shutdown
+TEMP_DIR = os.path.join(DATA_DIR, 'tmp')
+os.makedirs(TEMP_DIR, exist_ok=True)
+# Recent clips whose audio is not stored yet are downloaded on startup, at most this many
+RECOVER_MAX_CLIPS = int(os.getenv('RECOVER_MAX_CLIPS', 200))
+
+# Generation history, used to return an identical recent clip instead of
+# calling Murf again. Murf's audio links expire, so only recent clips are reused.
+history = GenerationHistory(os.path.join(DATA_DIR, 'history'))
+HISTORY_REUSE_SECONDS = int(os.getenv('HISTORY_REUSE_SECONDS', 24 * 3600))
+
+# Murf usage: characters sent per translate/synthesize call, voice and tenant
+usage = UsageLedger(os.path.join(DATA_DIR, 'usage'))
+TRANSLATE_COST_PER_CHAR = float(os.getenv('MURF_TRANSLATE_COST_PER_CHAR', os.getenv('MURF_COST_PER_CHAR', 1.0)))
+
+# Pronunciation lexicon, applied with SSML-style tags just before synthesis.
+# Edits to the file (or via /api/lexicon) are picked up without a restart.
+lexicon = Lexicon(os.getenv('LEXICON_PATH', os.path.join(DATA_DIR, 'lexicon.json')))
+
+# WebSocket sessions: per-connection cap on concurrent Murf calls, on requests
+# in flight, and on queued outgoing messages (a slow reader stalls its own jobs)
+WS_MAX_CONCURRENCY = int(os.getenv('WS_MAX_CONCURRENCY', 2))
+WS_MAX_PENDING = int(os.getenv('WS_MAX_PENDING', 8))
+WS_SEND_QUEUE_SIZE = int(os.getenv('WS_SEND_QUEUE_SIZE', 32))
+
+# Variant previews: most variants synthesized at once for a single request
+VARIANTS_MAX_CONCURRENCY = int(os.getenv('VARIANTS_MAX_CONCURRENCY', 4))
+
+# Scheduler in front of all Murf calls: per-class concurrency caps
+# ("interactive:4,batch:2,precompute:1") and per-API-key fair-share weights.
+# Tenants are the callers' X-API-Key (or WebSocket api_key) values, which are
+# not authenticated here: a client sending a new key per request would get a
+# fair share per key. If TENANT_API_KEYS is set, only those keys are tenants
+# of their own and every other key shares the anonymous tenant's share.
+TENANT_API_KEYS = {key.strip() for key in os.getenv('TENANT_API_KEYS', '').split(',') if key.strip()}
+scheduler = GenerationScheduler(
+    class_limits=parse_weights(os.getenv('SCHEDULER_CLASS_LIMITS', 'interactive:4,batch:2,precompute:1')),
+    total_limit=int(os.getenv('SCHEDULER_TOTAL_LIMIT', 6)),
+    tenant_weights=parse_weights(os.getenv('SCHEDULER_TENANT_WEIGHTS'))
+)
+
 # Pydantic models
 class TextToSpeechRequest(BaseModel):
-    text: str
+    text: str = Field(max_length=MAX_TEXT_CHARS)
     voice: Optional[str] = "Shaan"  # Changed from Miles to Shaan (valid Hindi voice)
     mood: Optional[str] = "Conversational"
     pitch: Optional[int] = 0
     translate: Optional[bool] = False
     target_language: Optional[str] = None
+    # "full" echoes all text fields, "minimal" returns only id + URL,
+    # "audio" streams the MP3 bytes back with metadata in X-* headers
+    response_mode: Optional[Literal['full', 'minimal', 'audio']] = 'full'
+    # Scheduling class: bulk jobs should send "batch" or "precompute"
+    priority: Optional[Literal['interactive', 'batch', 'precompute']] = 'interactive'
+    # Skip synthesis backends whose recent latency exceeds this
+    latency_budget_ms: Optional[int] = None
+
+class VariantsRequest(BaseModel):
+    text: str = Field(max_length=MAX_TEXT_CHARS)
+    voice: Optional[str] = "Shaan"
+    # Defaults to every mood the voice supports
+    moods: Optional[List[str]] = None
+    pitches: List[int] = Field([-10, 0, 10], min_length=1, max_length=13)
+    translate: Optional[bool] = False
+    target_language: Optional[str] = None
+    priority: Optional[Literal['interactive', 'batch', 'precompute']] = 'interactive'
+
+class LexiconUpdate(BaseModel):
+    # word -> respelling; a null value removes the word
+    entries: Dict[str, Optional[str]]
+
+class AudioProcessRequest(BaseModel):
+    # Stored clips to process, joined in this order
+    audio_ids: List[str] = Field(min_length=1, max_length=20)
+    normalize: Optional[bool] = True
+    target_dbfs: Optional[float] = Field(-18.0, ge=-40.0, le=-1.0)
+    trim_silence: Optional[bool] = True
+    silence_dbfs: Optional[float] = Field(-50.0, ge=-90.0, le=-20.0)
+    crossfade_ms: Optional[int] = Field(30, ge=0, le=1000)
 
 class DownloadRequest(BaseModel):
     audio_url: str
@@ -77,12 +262,359 @@ VOICE_MOODS = {
     }
 }
 
+def make_audio_id(text: str, voice_id: str, mood: Optional[str], pitch: Optional[int], backend: str) -> str:
+    """Content-addressed id for a generated clip"""
+    key = f"{backend}\x1f{voice_id}\x1f{mood}\x1f{pitch}\x1f{text}"
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+
+def fetch_upstream_audio(audio_id: str, audio_url: str):
+    """Open the generated MP3 at Murf, returning (chunk iterator, content length).
+
+    Chunks are written through to the audio store as they are read.
+    """
+    if not audio_url.startswith(('http://', 'https://')):
+        # A clip served only from the store (/api/audio/...) that has been evicted
+        raise HTTPException(status_code=404, detail="Audio is no longer available")
+    
+    # Ends when the last chunk has been relayed, not when the handler returns
+    span = tracer.start_span('audio.download', attributes={'audio.id': audio_id})
+    upstream = requests.get(audio_url, stream=True)
+    if upstream.status_code != 200:
+        upstream.close()
+        span.set_attribute('http.response.status_code', upstream.status_code)
+        span.end()
+        raise HTTPException(status_code=502, detail="Failed to fetch generated audio")
+
+    def iter_audio():
+        size = 0
+        try:
+            for chunk in audio_store.put_stream(audio_id, upstream.iter_content(chunk_size=AUDIO_CHUNK_SIZE)):
+                size += len(chunk)
+                yield chunk
+        finally:
+            upstream.close()
+            span.set_attribute('audio.bytes', size)
+            span.end()
+
+    return iter_audio(), upstream.headers.get('Content-Length')
+
+def iter_stored_audio(audio_id: str):
+    with open(audio_store.path(audio_id), 'rb') as f:
+        while True:
+            chunk = f.read(AUDIO_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+def iter_part_audio(audio_id: str, result):
+    """MP3 bytes of one synthesized part, downloaded from Murf if not synthesized locally"""
+    if result.audio_bytes is not None:
+        yield result.audio_bytes
+        return
+    span = tracer.start_span('audio.download', attributes={'audio.id': audio_id})
+    response = requests.get(result.audio_url, stream=True)
+    try:
+        if response.status_code != 200:
+            raise HTTPException(status_code=502, detail="Failed to fetch generated audio")
+        yield from response.iter_content(chunk_size=AUDIO_CHUNK_SIZE)
+    finally:
+        response.close()
+        span.end()
+
+def store_joined_audio(audio_id: str, results, cost: float):
+    """Join synthesized MP3 parts into one stored clip.
+
+    With ffmpeg the parts are decoded and encoded again as one stream. Without
+    it they are streamed into the store back to back, leaving out each part's
+    ID3 tag (but the first's) and Xing/Info frame, which would describe only
+    that part in the middle of the clip.
+    """
+    if len(results) > 1 and ffmpeg_available():
+        paths = []
+        try:
+            for result in results:
+                fd, path = tempfile.mkstemp(suffix='.mp3', dir=TEMP_DIR)
+                paths.append(path)
+                with os.fdopen(fd, 'wb') as f:
+                    for chunk in iter_part_audio(audio_id, result):
+                        f.write(chunk)
+            rendered = render_to_temp(paths, audio_store.root, normalize=False, trim_silence=False)
+        finally:
+            for path in paths:
+                os.remove(path)
+        audio_store.adopt(audio_id, rendered, cost)
+        return
+    
+    def iter_parts():
+        if len(results) == 1:
+            yield from iter_part_audio(audio_id, results[0])
+            return
+        for index, result in enumerate(results):
+            yield from strip_mp3_headers(iter_part_audio(audio_id, result), keep_id3=index == 0)
+    
+    for _ in audio_store.put_stream(audio_id, iter_parts(), cost):
+        pass
+
+def stream_audio_response(audio_id: str, audio_url: str, headers: dict):
+    """Send the generated MP3 straight back to the caller, keeping a copy in the audio store"""
+    if audio_store.has(audio_id):
+        return FileResponse(audio_store.path(audio_id), media_type='audio/mpeg', headers=headers)
+
+    chunks, content_length = fetch_upstream_audio(audio_id, audio_url)
+    if content_length:
+        headers['Content-Length'] = content_length
+
+    return StreamingResponse(chunks, media_type='audio/mpeg', headers=headers)
+
+def clear_temp_files():
+    """Remove temp files left behind by a crash; younger ones may belong to another worker still using them"""
+    now = time.time()
+    for name in os.listdir(TEMP_DIR):
+        path = os.path.join(TEMP_DIR, name)
+        try:
+            if now - os.path.getmtime(path) > AudioStore.STALE_PART_SECONDS:
+                os.remove(path)
+        except OSError:
+            pass
+
+async def recover_undelivered():
+    """Download recent clips that no caller received and that are not stored, while their Murf URLs still work"""
+    audio_ids = await run_in_threadpool(history.undelivered, time.time() - HISTORY_REUSE_SECONDS, RECOVER_MAX_CLIPS)
+    recovered = 0
+    for audio_id in audio_ids:
+        if lifecycle.draining:
+            break
+        if audio_store.has(audio_id, hit=False) or not audio_store.source(audio_id):
+            continue
+        try:
+            if await run_in_threadpool(audio_store.fetch, audio_id):
+                recovered += 1
+        except requests.exceptions.RequestException as e:
+            print(f"Recovering {audio_id} failed: {e}")
+    if recovered:
+        print(f"Recovered {recovered} undelivered clips into the audio store")
+
+def resolve_voice(voice: Optional[str]):
+    """Look up the Murf voice ID and language for a voice name"""
+    voice_config = VOICE_MOODS.get(voice, {})
+    voice_id = voice_config.get('voice_id')
+    
+    if not voice_id:
+        raise HTTPException(status_code=400, detail=f"Invalid voice: {voice}")
+    
+    return voice_id, voice_config.get('language')
+
+def translate_text(text: str, target_language: str, tenant: Optional[str] = None,
+                   voice_id: Optional[str] = None) -> Optional[str]:
+    """Translate text using Murf's translation API, None if nothing came back.
+
+    Long texts are sent as several sentence-aligned pieces in one call. Tags
+    and lexicon words are kept out of the translation and put back afterwards.
+    The characters sent are recorded in the usage ledger against tenant and voice.
+    """
+    protected, originals = lexicon.protect(text)
+    texts = chunk_text(protected, TRANSLATE_CHUNK_CHARS)
+    with tracer.start_as_current_span('murf.translate', attributes={
+        'murf.target_language': target_language,
+        'murf.characters': len(text),
+        'murf.pieces': len(texts)
+    }):
+        translation_response = client.text.translate(
+            target_language=target_language,
+            texts=texts  # texts parameter expects a list
+        )
+    usage.record(hash_tenant(tenant), 'translate', voice_id, 'murf', len(text),
+                 len(text) * TRANSLATE_COST_PER_CHAR, language=target_language)
+    
+    # Extract translated text from response; translations is a list of Translation objects
+    translations = getattr(translation_response, 'translations', None) or []
+    translated = [getattr(translation, 'translated_text', None) for translation in translations]
+    if translated and len(translated) == len(texts) and all(piece is not None for piece in translated):
+        return lexicon.restore(' '.join(translated), originals)
+    return None
+
+def translation_target(request: TextToSpeechRequest, voice_language: Optional[str]) -> Optional[str]:
+    """Language prepare_text() will translate into, None if the text is used as-is"""
+    if request.translate and request.target_language:
+        return request.target_language
+    if voice_language == "hi-IN" and not any(ord(char) > 127 for char in request.text):
+        return "hi-IN"
+    return None
+
+async def run_scheduled(request: TextToSpeechRequest, tenant: Optional[str], func, *args,
+                        cost: Optional[int] = None):
+    """Run a blocking Murf call in the threadpool once the scheduler grants a slot.
+
+    cost is the characters the call sends, the whole request text by default.
+    """
+    if TENANT_API_KEYS and tenant not in TENANT_API_KEYS:
+        tenant = None
+    async with scheduler.slot(request.priority, tenant, cost=len(request.text) if cost is None else cost):
+        return await run_in_threadpool(profiled(func), *args)
+
+def prepare_text(request: TextToSpeechRequest, voice_language: Optional[str], tenant: Optional[str] = None):
+    """Work out the text to synthesize, translating it if needed.
+
+    Returns (text_to_generate, translated_text, fell_back); fell_back is True
+    if a translation was wanted but the original text is used instead.
+    """
+    # If translation is requested or voice language is different from English
+    if request.translate and request.target_language:
+        try:
+            translated_text = translate_text(
+                request.text, request.target_language, tenant, VOICE_MOODS.get(request.voice, {}).get('voice_id')
+            )
+        except Exception as e:
+            # If translation fails, continue with original text
+            print(f"Translation failed: {e}")
+            translated_text = None
+        if translated_text is None:
+            return request.text, request.text, True
+        return translated_text, translated_text, False
+    
+    # Auto-translate if voice language is Hindi and text appears to be English
+    if voice_language == "hi-IN" and not any(ord(char) > 127 for char in request.text):
+        try:
+            translated_text = translate_text(
+                request.text, "hi-IN", tenant, VOICE_MOODS.get(request.voice, {}).get('voice_id')
+            )
+        except Exception as e:
+            # If auto-translation fails, use original text
+            print(f"Auto-translation failed: {e}")
+            translated_text = None
+        return translated_text or request.text, translated_text, translated_text is None
+    
+    return request.text, None, False
+
+async def create_clip(request: TextToSpeechRequest, api_key: Optional[str], voice_id: str,
+                      voice_language: Optional[str], on_translated=None, translate=None) -> dict:
+    """Translate and synthesize a request, or reuse a recent identical generation.
+
+    Returns the history entry of the clip with a 'reused' flag. on_translated,
+    if given, is awaited with (text_to_generate, translated_text) as soon as
+    the translation is ready. translate, if given, is awaited instead of
+    calling prepare_text(), so several clips can share one translation.
+    """
+    language = translation_target(request, voice_language)
+    text_hash = hash_text(request.text)
+    lexicon_version = lexicon.version
+    
+    # Only full-quality clips are reused, never ones from a fallback engine
+    previous = await run_in_threadpool(
+        history.lookup, text_hash, voice_id, request.mood, request.pitch, language or 'none', lexicon_version,
+        synthesis_router.primary, HISTORY_REUSE_SECONDS
+    )
+    if previous and not previous['audio_url'].startswith(('http://', 'https://')) \
+            and not audio_store.has(previous['id'], hit=False):
+        # Joined and local clips live only in the audio store; once evicted they are gone
+        previous = None
+    if previous:
+        if on_translated:
+            await on_translated(previous['final_text'], previous['translated_text'])
+        # The caller gets its own row pointing at the same clip, so the clip shows
+        # up in its history; created_at stays that of the clip, which bounds reuse
+        previous.pop('seq', None)
+        entry = await run_in_threadpool(history.record, dict(previous, tenant=hash_tenant(api_key)))
+        return dict(entry, reused=True)
+    
+    # Murf calls go through the scheduler and the threadpool
+    text_to_generate, translated_text, fell_back = request.text, None, False
+    if language and translate:
+        text_to_generate, translated_text, fell_back = await translate()
+    elif language:
+        text_to_generate, translated_text, fell_back = await run_scheduled(
+            request, api_key, prepare_text, request, voice_language, api_key
+        )
+    if on_translated:
+        await on_translated(text_to_generate, translated_text)
+    
+    # Pronunciation fixes and tags only affect what is spoken, not the text shown to users
+    spoken_text = lexicon.preprocess(text_to_generate)
+    latency_budget = request.latency_budget_ms / 1000 if request.latency_budget_ms else None
+    
+    # Long texts are synthesized in several calls and joined in the audio store
+    parts = chunk_text(spoken_text, SYNTH_CHUNK_CHARS)
+    
+    async def synthesize_part(backend_name: str, part: str):
+        result = await run_scheduled(
+            request, api_key, synthesis_router.synthesize,
+            part, voice_id, request.mood, request.pitch, voice_language, latency_budget, backend_name,
+            cost=len(part)
+        )
+        await run_in_threadpool(
+            usage.record, hash_tenant(api_key), 'synthesize', voice_id, result.backend, result.characters,
+            result.cost, language=voice_language
+        )
+        return result
+    
+    async def synthesize_parts(backend_name: str):
+        tasks = [asyncio.ensure_future(synthesize_part(backend_name, part)) for part in parts]
+        try:
+            return await asyncio.gather(*tasks)
+        finally:
+            # If one part failed the others are of no use
+            for task in tasks:
+                task.cancel()
+    
+    # Once started, synthesis finishes and is recorded even if the caller goes
+    # away (disconnect, shutdown), so the paid-for clip can be reused later
+    async def synthesize_and_record():
+        # Every part of a clip comes from the same backend so the voice does not
+        # change mid-clip; if one part fails the whole clip moves to the next backend
+        candidates = synthesis_router.candidates(len(spoken_text), latency_budget)
+        if not candidates:
+            raise HTTPException(status_code=503, detail="No speech synthesis backend is available")
+        for candidate in candidates:
+            try:
+                results = await synthesize_parts(candidate.name)
+                break
+            except SynthesisError as e:
+                last_error = e
+        else:
+            raise HTTPException(status_code=503, detail=str(last_error))
+        
+        # What the clip cost to make decides how long the audio store keeps it
+        cost = sum(result.cost for result in results)
+        
+        backend = results[0].backend
+        audio_id = make_audio_id(spoken_text, voice_id, request.mood, request.pitch, backend)
+        if len(results) == 1 and results[0].audio_bytes is None:
+            audio_url = results[0].audio_url
+            audio_store.register_source(audio_id, audio_url, cost)
+        else:
+            # Joined or locally synthesized audio has no upstream URL, it is served from the store
+            await run_in_threadpool(profiled(store_joined_audio), audio_id, results, cost)
+            audio_url = f"/api/audio/{audio_id}"
+        
+        entry = {
+            'id': audio_id,
+            'tenant': hash_tenant(api_key),
+            'text_hash': text_hash,
+            'voice': voice_id,
+            'mood': request.mood,
+            'pitch': request.pitch,
+            'language': language or 'none',
+            'lexicon': lexicon_version,
+            'backend': backend,
+            'original_text': request.text,
+            'translated_text': translated_text,
+            'final_text': text_to_generate,
+            'spoken_text': spoken_text,
+            'audio_url': audio_url
+        }
+        # An untranslated fallback clip must not be reused as the translated one
+        if fell_back:
+            return dict(entry, created_at=time.time(), reused=False)
+        return dict(await run_in_threadpool(history.record, entry), reused=False)
+    
+    return await lifecycle.finish(synthesize_and_record())
+
 @app.get("/")
 async def home():
     """Home route"""
     return {
         'message': 'MurfAI Text-to-Speech Backend API',
-        'status': 'running'
+        'status': 'draining' if lifecycle.draining else 'running'
     }
 
 @app.get("/api/voices")
@@ -96,8 +628,51 @@ async def get_voices():
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/synthesis/backends")
+async def get_synthesis_backends():
+    """Availability, health and latency of each speech synthesis backend"""
+    return {
+        'success': True,
+        'primary': synthesis_router.primary,
+        'backends': synthesis_router.stats()
+    }
+
+@app.get("/api/scheduler/stats")
+async def get_scheduler_stats():
+    """Queue depth, running jobs and wait-time histograms per priority class"""
+    return {
+        'success': True,
+        'scheduler': scheduler.stats()
+    }
+
+def require_admin(x_admin_token: Optional[str]):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not found")
+    if not is_admin(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+@app.get("/api/admin/profile", response_class=PlainTextResponse)
+async def profile_backend(seconds: float = 10, x_admin_token: Optional[str] = Header(None)):
+    """Sample every thread of the process for some seconds; returns folded stacks for a flamegraph"""
+    require_admin(x_admin_token)
+    if not 0 < seconds <= PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be between 0 and {PROFILE_MAX_SECONDS}")
+    
+    return await profile_process(seconds, PROFILE_INTERVAL_MS / 1000)
+
+@app.get("/api/admin/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_request_profile(profile_id: str, x_admin_token: Optional[str] = Header(None)):
+    """Folded stacks of a request profiled with the X-Profile header"""
+    require_admin(x_admin_token)
+    folded = request_profiles.get(profile_id)
+    if folded is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    
+    return folded
+
 @app.post("/api/generate")
-async def generate_audio(request: TextToSpeechRequest):
+async def generate_audio(request: TextToSpeechRequest, background_tasks: BackgroundTasks,
+                         x_api_key: Optional[str] = Header(None)):
     """Generate audio from text using Murf AI with optional translation"""
     try:
         # Validate input
@@ -105,89 +680,13 @@ async def generate_audio(request: TextToSpeechRequest):
             raise HTTPException(status_code=400, detail="Text is required")
         
         # Get voice ID and language
-        voice_config = VOICE_MOODS.get(request.voice, {})
-        voice_id = voice_config.get('voice_id')
-        voice_language = voice_config.get('language')
+        voice_id, voice_language = resolve_voice(request.voice)
         
-        if not voice_id:
-            raise HTTPException(status_code=400, detail=f"Invalid voice: {request.voice}")
-        
-        # Prepare text for generation
-        text_to_generate = request.text
-        translated_text = None
-        
-        # If translation is requested or voice language is different from English
-        if request.translate and request.target_language:
-            try:
-                # Translate the text using Murf's translation API (correct format)
-                translation_response = client.text.translate(
-                    target_language=request.target_language,
-                    texts=[request.text]  # texts parameter expects a list
-                )
-                
-                # Extract translated text from response
-                if hasattr(translation_response, 'translations') and translation_response.translations:
-                    # translations is a list of Translation objects
-                    first_translation = translation_response.translations[0]
-                    if hasattr(first_translation, 'translated_text'):
-                        translated_text = first_translation.translated_text
-                        text_to_generate = translated_text
-                    else:
-                        translated_text = request.text
-                        text_to_generate = request.text
-                else:
-                    # If translation fails, use original text
-                    translated_text = request.text
-                    text_to_generate = request.text
-                    
-            except Exception as e:
-                # If translation fails, continue with original text
-                print(f"Translation failed: {e}")
-                translated_text = request.text
-                text_to_generate = request.text
-        
-        # Auto-translate if voice language is Hindi and text appears to be English
-        elif voice_language == "hi-IN" and not any(ord(char) > 127 for char in request.text):
-            try:
-                # Auto-translate to Hindi (correct format)
-                translation_response = client.text.translate(
-                    target_language="hi-IN",
-                    texts=[request.text]  # texts parameter expects a list
-                )
-                
-                # Extract translated text from response
-                if hasattr(translation_response, 'translations') and translation_response.translations:
-                    # translations is a list of Translation objects
-                    first_translation = translation_response.translations[0]
-                    if hasattr(first_translation, 'translated_text'):
-                        translated_text = first_translation.translated_text
-                        text_to_generate = translated_text
-                    else:
-                        text_to_generate = request.text
-                else:
-                    # If translation fails, use original text
-                    text_to_generate = request.text
-                    
-            except Exception as e:
-                # If auto-translation fails, use original text
-                print(f"Auto-translation failed: {e}")
-                text_to_generate = request.text
-        
-        # Generate audio using Murf
-        response = client.text_to_speech.generate(
-            format="MP3",
-            sample_rate=48000.0,
-            channel_type="STEREO",
-            text=text_to_generate,
-            voice_id=voice_id,
-            style=request.mood,
-            pitch=request.pitch
-        )
-        
-        audio_url = response.audio_file if hasattr(response, "audio_file") else None
-        
-        if not audio_url:
-            raise HTTPException(status_code=500, detail="Failed to generate audio")
+        clip = await create_clip(request, x_api_key, voice_id, voice_language)
+        audio_id = clip['id']
+        audio_url = clip['audio_url']
+        text_to_generate = clip['final_text']
+        translated_text = clip['translated_text']
         
         # Debug information
         print(f"DEBUG - Original text: {request.text}")
@@ -196,8 +695,33 @@ async def generate_audio(request: TextToSpeechRequest):
         print(f"DEBUG - Translation enabled: {request.translate}")
         print(f"DEBUG - Target language: {request.target_language}")
         print(f"DEBUG - Voice language: {voice_language}")
+        print(f"DEBUG - Reused previous generation: {clip['reused']}")
+        
+        # Runs once the response has been sent in full; startup recovery skips delivered clips
+        background_tasks.add_task(history.mark_delivered, audio_id)
+        
+        if request.response_mode == 'minimal':
+            return {'id': audio_id, 'audio_url': audio_url}
+        
+        if request.response_mode == 'audio':
+            # The caller already has the original text. Header values must be
+            # latin-1, so the translation is percent-encoded, and proxies cap
+            # header sizes, so a long one is only flagged as left out.
+            headers = {
+                'X-Audio-Id': audio_id,
+                'X-Audio-Url': audio_url,
+                'X-Voice-Language': voice_language or '',
+            }
+            if translated_text is not None:
+                encoded = quote(translated_text)
+                if len(encoded) <= TEXT_HEADER_MAX_BYTES:
+                    headers['X-Translated-Text'] = encoded
+                else:
+                    headers['X-Translated-Text-Omitted'] = '1'
+            return await run_in_threadpool(profiled(stream_audio_response), audio_id, audio_url, headers)
         
         return {
+            'id': audio_id,
             'success': True,
             'audio_url': audio_url,
             'original_text': request.text,
@@ -206,6 +730,7 @@ async def generate_audio(request: TextToSpeechRequest):
             'voice_language': voice_language,
             'translation_enabled': request.translate,
             'target_language': request.target_language,
+            'reused': clip['reused'],
             'message': 'Audio generated successfully'
         }
         
@@ -214,6 +739,208 @@ async def generate_audio(request: TextToSpeechRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/generate/variants")
+async def generate_variants(request: VariantsRequest, x_api_key: Optional[str] = Header(None)):
+    """Generate every mood x pitch combination of one text for side-by-side preview.
+
+    The text is translated once and the variants are synthesized concurrently;
+    results stream back as newline-delimited JSON in completion order.
+    """
+    if not request.text.strip():
+        raise HTTPException(status_code=400, detail="Text is required")
+    
+    voice_id, voice_language = resolve_voice(request.voice)
+    available_moods = VOICE_MOODS[request.voice]['moods']
+    moods = request.moods or available_moods
+    invalid = [mood for mood in moods if mood not in available_moods]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Invalid mood for {request.voice}: {', '.join(invalid)}")
+    if any(pitch < -50 or pitch > 50 for pitch in request.pitches):
+        raise HTTPException(status_code=400, detail="Pitch must be between -50 and 50")
+    
+    base = TextToSpeechRequest(
+        text=request.text,
+        voice=request.voice,
+        translate=request.translate,
+        target_language=request.target_language,
+        priority=request.priority
+    )
+    variants = [
+        base.model_copy(update={'mood': mood, 'pitch': pitch})
+        for mood in dict.fromkeys(moods)
+        for pitch in dict.fromkeys(request.pitches)
+    ]
+    
+    translation = None
+    
+    async def translate_once():
+        # Started by whichever variant needs it first, awaited by all of them
+        nonlocal translation
+        if translation is None:
+            translation = asyncio.ensure_future(
+                run_scheduled(base, x_api_key, prepare_text, base, voice_language, x_api_key)
+            )
+        return await translation
+    
+    pool = asyncio.Semaphore(VARIANTS_MAX_CONCURRENCY)
+    
+    async def run_variant(variant: TextToSpeechRequest):
+        result = {'mood': variant.mood, 'pitch': variant.pitch}
+        try:
+            async with pool:
+                clip = await create_clip(variant, x_api_key, voice_id, voice_language, translate=translate_once)
+            result.update({
+                'success': True,
+                'id': clip['id'],
+                'audio_url': clip['audio_url'],
+                'final_text': clip['final_text'],
+                'reused': clip['reused']
+            })
+        except HTTPException as e:
+            result.update({'success': False, 'error': e.detail})
+        except Exception as e:
+            result.update({'success': False, 'error': str(e)})
+        return result
+    
+    async def stream_results():
+        tasks = [asyncio.ensure_future(run_variant(variant)) for variant in variants]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                yield json.dumps(result, ensure_ascii=False) + '\n'
+                if result['success']:
+                    await run_in_threadpool(history.mark_delivered, result['id'])
+        finally:
+            # Client went away: stop synthesizing variants nobody will hear
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(stream_results(), media_type='application/x-ndjson')
+
+@app.get("/api/usage")
+async def get_usage(group_by: str = 'call_type,voice', since: Optional[float] = None,
+                    x_api_key: Optional[str] = Header(None), x_admin_token: Optional[str] = Header(None)):
+    """Murf characters and cost spent, in total and per group; admins see every tenant"""
+    columns = [column.strip() for column in group_by.split(',') if column.strip()]
+    if any(column not in GROUP_COLUMNS for column in columns):
+        raise HTTPException(status_code=400, detail=f"group_by must be a list of {', '.join(GROUP_COLUMNS)}")
+    
+    tenant = None if is_admin(x_admin_token, ADMIN_TOKEN) else hash_tenant(x_api_key)
+    totals, groups = await run_in_threadpool(usage.totals, columns, tenant, since)
+    return {
+        'success': True,
+        'totals': totals,
+        'groups': groups,
+        'cache': audio_store.stats()
+    }
+
+@app.get("/api/lexicon")
+async def get_lexicon():
+    """Current pronunciation lexicon"""
+    return {
+        'success': True,
+        'version': lexicon.version,
+        'entries': lexicon.entries
+    }
+
+@app.put("/api/lexicon")
+async def update_lexicon(update: LexiconUpdate, x_admin_token: Optional[str] = Header(None)):
+    """Add, replace or (with a null value) remove pronunciation entries; admin only"""
+    require_admin(x_admin_token)
+    try:
+        await run_in_threadpool(lexicon.update, update.entries)
+    except OSError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {
+        'success': True,
+        'version': lexicon.version,
+        'entries': lexicon.entries
+    }
+
+@app.get("/api/history")
+async def get_history(cursor: Optional[int] = None, limit: int = 20, since: Optional[float] = None,
+                      x_api_key: Optional[str] = Header(None), x_admin_token: Optional[str] = Header(None)):
+    """Newest-first generation history for the caller's API key, paginated by cursor.
+
+    Callers without a key all share the anonymous tenant, so they get an empty
+    history; only admins can list the anonymous generations.
+    """
+    if not x_api_key and not is_admin(x_admin_token, ADMIN_TOKEN):
+        return {
+            'success': True,
+            'items': [],
+            'next_cursor': None
+        }
+    
+    limit = max(1, min(limit, 100))
+    items, next_cursor = await run_in_threadpool(history.page, hash_tenant(x_api_key), cursor, limit, since)
+    for item in items:
+        item.pop('tenant', None)
+    return {
+        'success': True,
+        'items': items,
+        'next_cursor': next_cursor
+    }
+
+@app.get("/api/audio/{audio_id}")
+async def get_audio(audio_id: str):
+    """Serve a generated clip by its content-addressed id"""
+    if not AUDIO_ID_PATTERN.fullmatch(audio_id):
+        raise HTTPException(status_code=404, detail="Audio not found")
+    
+    path = await run_in_threadpool(audio_store.fetch, audio_id)
+    if not path:
+        raise HTTPException(status_code=404, detail="Audio not found")
+    
+    return FileResponse(
+        path,
+        media_type='audio/mpeg',
+        headers={'ETag': f'"{audio_id}"'}
+    )
+
+@app.post("/api/audio/process")
+async def process_audio(request: AudioProcessRequest, x_api_key: Optional[str] = Header(None)):
+    """Normalize loudness, trim silence and crossfade-join stored clips into a new clip"""
+    if not all(AUDIO_ID_PATTERN.fullmatch(audio_id) for audio_id in request.audio_ids):
+        raise HTTPException(status_code=400, detail="Invalid audio id")
+    
+    # The output is content-addressed by its inputs and parameters, so repeats are free.
+    # Levels are rounded to 0.1 dB so near-identical requests share one output.
+    options = request.model_dump(exclude={'audio_ids'})
+    options['target_dbfs'] = round(request.target_dbfs, 1)
+    options['silence_dbfs'] = round(request.silence_dbfs, 1)
+    params = json.dumps(dict(options, audio_ids=request.audio_ids), sort_keys=True)
+    output_id = hashlib.sha256(params.encode('utf-8')).hexdigest()[:32]
+    cached = audio_store.has(output_id)
+    
+    if not cached:
+        paths = []
+        for audio_id in request.audio_ids:
+            path = await run_in_threadpool(audio_store.fetch, audio_id)
+            if not path:
+                raise HTTPException(status_code=404, detail=f"Audio not found: {audio_id}")
+            paths.append(path)
+        
+        tenant = x_api_key if not TENANT_API_KEYS or x_api_key in TENANT_API_KEYS else None
+        try:
+            async with scheduler.slot('batch', tenant, cost=len(paths)):
+                rendered = await run_in_threadpool(
+                    render_to_temp, paths, audio_store.root,
+                    max_seconds=AUDIO_PROCESS_MAX_SECONDS, **options
+                )
+        except ValueError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except RuntimeError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        audio_store.adopt(output_id, rendered)
+    
+    return {
+        'success': True,
+        'id': output_id,
+        'audio_path': f'/api/audio/{output_id}',
+        'cached': cached
+    }
+
 @app.post("/api/download")
 async def download_audio(request: DownloadRequest):
     """Download and serve audio file"""
@@ -222,35 +949,154 @@ async def download_audio(request: DownloadRequest):
             raise HTTPException(status_code=400, detail="Audio URL is required")
         
         # Download the audio file
-        response = requests.get(request.audio_url, stream=True)
-        
-        if response.status_code == 200:
-            # Create a temporary file
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp3')
-            
-            # Write audio data to temp file
-            for chunk in response.iter_content(chunk_size=1024):
-                temp_file.write(chunk)
-            
-            temp_file.close()
+        with tracer.start_as_current_span('audio.download'):
+            response = requests.get(request.audio_url, stream=True)
             
-            # Return the file
-            return FileResponse(
-                temp_file.name,
-                media_type='audio/mpeg',
-                filename='generated_audio.mp3'
-            )
-        else:
-            raise HTTPException(status_code=500, detail="Failed to download audio")
+            if response.status_code == 200:
+                # Create a temporary file, deleted once it has been sent
+                temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp3', dir=TEMP_DIR)
+                
+                # Write audio data to temp file
+                for chunk in response.iter_content(chunk_size=1024):
+                    temp_file.write(chunk)
+                
+                temp_file.close()
+            else:
+                raise HTTPException(status_code=500, detail="Failed to download audio")
+        
+        # Return the file
+        return FileResponse(
+            temp_file.name,
+            media_type='audio/mpeg',
+            filename='generated_audio.mp3',
+            background=BackgroundTask(os.remove, temp_file.name)
+        )
             
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.websocket("/ws/tts")
+async def tts_websocket(websocket: WebSocket):
+    """Interactive TTS session over a single connection.
+
+    The client sends one JSON message per generation with the same fields as
+    /api/generate plus an optional "id". Translation and synthesis run as soon
+    as a message arrives, and the server pushes back "translation",
+    "audio_start", "audio_chunk" (base64 MP3) and "audio_end" messages tagged
+    with that id, or an "error" message.
+    """
+    await websocket.accept()
+    # Browsers cannot set headers on a WebSocket, so the key may come in the
+    # query string; like X-API-Key it only names the tenant (see TENANT_API_KEYS)
+    tenant = websocket.headers.get('x-api-key') or websocket.query_params.get('api_key')
+    
+    outbox = asyncio.Queue(maxsize=WS_SEND_QUEUE_SIZE)
+    slots = asyncio.Semaphore(WS_MAX_CONCURRENCY)
+    jobs = set()
+    
+    async def sender():
+        while True:
+            await websocket.send_json(await outbox.get())
+    
+    async def run_job(message_id, request: TextToSpeechRequest):
+        try:
+            if not request.text.strip():
+                raise HTTPException(status_code=400, detail="Text is required")
+            voice_id, voice_language = resolve_voice(request.voice)
+            
+            async def send_translation(text_to_generate, translated_text):
+                await outbox.put({
+                    'type': 'translation',
+                    'id': message_id,
+                    'original_text': request.text,
+                    'translated_text': translated_text,
+                    'final_text': text_to_generate
+                })
+            
+            async with slots:
+                clip = await create_clip(request, tenant, voice_id, voice_language, on_translated=send_translation)
+            audio_id = clip['id']
+            audio_url = clip['audio_url']
+            await outbox.put({
+                'type': 'audio_start',
+                'id': message_id,
+                'audio_id': audio_id,
+                'audio_url': audio_url,
+                'reused': clip['reused']
+            })
+            
+            if audio_store.has(audio_id):
+                chunks = iter_stored_audio(audio_id)
+            else:
+                chunks, _ = await run_in_threadpool(fetch_upstream_audio, audio_id, audio_url)
+            
+            seq = 0
+            async for chunk in iterate_in_threadpool(chunks):
+                # Blocks while the outbox is full, which pauses reading from Murf
+                await outbox.put({
+                    'type': 'audio_chunk',
+                    'id': message_id,
+                    'seq': seq,
+                    'data': base64.b64encode(chunk).decode('ascii')
+                })
+                seq += 1
+            await outbox.put({'type': 'audio_end', 'id': message_id, 'audio_id': audio_id, 'chunks': seq})
+            await run_in_threadpool(history.mark_delivered, audio_id)
+            
+        except HTTPException as e:
+            await outbox.put({'type': 'error', 'id': message_id, 'detail': e.detail})
+        except Exception as e:
+            await outbox.put({'type': 'error', 'id': message_id, 'detail': str(e)})
+    
+    send_task = asyncio.create_task(sender())
+    try:
+        while True:
+            message_id = None
+            try:
+                data = json.loads(await websocket.receive_text())
+                message_id = data.get('id')
+                request = TextToSpeechRequest(**data)
+            except (ValueError, AttributeError, TypeError, ValidationError) as e:
+                await outbox.put({'type': 'error', 'id': message_id, 'detail': f"Invalid message: {e}"})
+                continue
+            
+            if lifecycle.draining:
+                await outbox.put({'type': 'error', 'id': message_id, 'detail': "Server is shutting down"})
+                continue
+            
+            if len(jobs) >= WS_MAX_PENDING:
+                await outbox.put({'type': 'error', 'id': message_id, 'detail': "Too many pending requests"})
+                continue
+            
+            job = asyncio.create_task(run_job(message_id, request))
+            jobs.add(job)
+            job.add_done_callback(jobs.discard)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        for job in jobs:
+            job.cancel()
+        send_task.cancel()
+
 if __name__ == '__main__':
     import uvicorn
     host = os.getenv('HOST', 'localhost')
     port = int(os.getenv('PORT', 8000))
     
-    uvicorn.run(app, host=host, port=port)
+    # Uvicorn stops accepting connections on SIGTERM and waits up to
+    # timeout_graceful_shutdown for open ones; requests arriving on kept-alive
+    # connections meanwhile get 503 because draining starts at the signal
+    server = uvicorn.Server(uvicorn.Config(
+        app, host=host, port=port,
+        timeout_graceful_shutdown=int(os.getenv('SHUTDOWN_TIMEOUT_SECONDS', 25))
+    ))
+    handle_exit = server.handle_exit
+    
+    def drain_and_exit(sig, frame):
+        lifecycle.start_draining()
+        handle_exit(sig, frame)
+    
+    server.handle_exit = drain_and_exit
+    server.run()
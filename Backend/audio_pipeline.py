@@ -0,0 +1,313 @@
+"""
+Audio post-processing: loudness normalization, silence trimming and
+crossfade concatenation of generated clips.
+
+Clips are decoded to float32 PCM with ffmpeg and handled in fixed-size chunks.
+Each clip is spooled to a temporary file once while its loudness, peak and
+first/last non-silent frames are measured, then read back trimmed and with the
+gain applied, so memory stays bounded however long the clips are. The result
+is re-encoded to MP3 with ffmpeg.
+
+Without ffmpeg, MP3 files can still be joined byte for byte once each part's
+ID3v2 tag and Xing/Info header frame are left out (strip_mp3_headers).
+"""
+import itertools
+import os
+import shutil
+import subprocess
+import tempfile
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+SAMPLE_RATE = 48000
+CHANNELS = 2
+CHUNK_FRAMES = 32768
+# Never push the peak above -1 dBFS when normalizing
+PEAK_CEILING = 10 ** (-1 / 20)
+
+
+class ClipStats:
+    def __init__(self):
+        self.frames = 0
+        self.loud_sum_squares = 0.0
+        self.loud_samples = 0
+        self.peak = 0.0
+        self.first_loud: Optional[int] = None
+        self.last_loud: Optional[int] = None
+
+
+def _ffmpeg() -> str:
+    path = shutil.which('ffmpeg')
+    if not path:
+        raise RuntimeError("Audio processing needs ffmpeg installed on the server")
+    return path
+
+
+def ffmpeg_available() -> bool:
+    return shutil.which('ffmpeg') is not None
+
+
+def decode(path: str, chunk_frames: int = CHUNK_FRAMES) -> Iterator[np.ndarray]:
+    """Decode any audio file to float32 chunks of shape (frames, CHANNELS).
+
+    Raises RuntimeError if ffmpeg fails, e.g. on a corrupt or non-audio file.
+    """
+    # ffmpeg's errors go to a file so a chatty stderr can never block its stdout
+    errors = tempfile.TemporaryFile()
+    process = subprocess.Popen(
+        [_ffmpeg(), '-v', 'error', '-i', path, '-f', 'f32le', '-ac', str(CHANNELS), '-ar', str(SAMPLE_RATE), 'pipe:1'],
+        stdout=subprocess.PIPE, stderr=errors
+    )
+    frame_bytes = 4 * CHANNELS
+    try:
+        while True:
+            data = process.stdout.read(chunk_frames * frame_bytes)
+            if not data:
+                break
+            usable = len(data) - len(data) % frame_bytes
+            yield np.frombuffer(data[:usable], dtype=np.float32).reshape(-1, CHANNELS)
+        if process.wait() != 0:
+            errors.seek(0)
+            message = errors.read().decode('utf-8', errors='replace').strip().splitlines()
+            raise RuntimeError(f"ffmpeg failed to decode audio: {message[-1] if message else process.returncode}")
+    finally:
+        process.stdout.close()
+        process.kill()
+        process.wait()
+        errors.close()
+
+
+def encode_mp3(chunks: Iterable[np.ndarray], out_path: str, bitrate: str = '192k'):
+    """Encode float32 chunks to an MP3 file"""
+    process = subprocess.Popen(
+        [_ffmpeg(), '-v', 'error', '-y', '-f', 'f32le', '-ac', str(CHANNELS), '-ar', str(SAMPLE_RATE),
+         '-i', 'pipe:0', '-codec:a', 'libmp3lame', '-b:a', bitrate, '-f', 'mp3', out_path],
+        stdin=subprocess.PIPE, stderr=subprocess.DEVNULL
+    )
+    try:
+        for chunk in chunks:
+            process.stdin.write(np.ascontiguousarray(chunk, dtype=np.float32).tobytes())
+    finally:
+        process.stdin.close()
+        if process.wait() != 0:
+            raise RuntimeError("ffmpeg failed to encode audio")
+
+
+def spool(chunks: Iterable[np.ndarray], spool_file, silence_threshold: float) -> ClipStats:
+    """Write chunks to spool_file and measure loudness, peak and silent edges"""
+    stats = ClipStats()
+    for chunk in chunks:
+        amplitude = np.abs(chunk).max(axis=1)
+        loud = amplitude > silence_threshold
+        if loud.any():
+            loud_indexes = np.flatnonzero(loud)
+            if stats.first_loud is None:
+                stats.first_loud = stats.frames + int(loud_indexes[0])
+            stats.last_loud = stats.frames + int(loud_indexes[-1])
+            loud_frames = chunk[loud]
+            stats.loud_sum_squares += float(np.square(loud_frames, dtype=np.float64).sum())
+            stats.loud_samples += loud_frames.size
+        stats.peak = max(stats.peak, float(amplitude.max(initial=0.0)))
+        stats.frames += len(chunk)
+        spool_file.write(chunk.astype(np.float32, copy=False).tobytes())
+    spool_file.flush()
+    return stats
+
+
+def read_spool(spool_file, start: int, stop: int, chunk_frames: int = CHUNK_FRAMES) -> Iterator[np.ndarray]:
+    frame_bytes = 4 * CHANNELS
+    spool_file.seek(start * frame_bytes)
+    remaining = stop - start
+    while remaining > 0:
+        count = min(chunk_frames, remaining)
+        data = spool_file.read(count * frame_bytes)
+        if not data:
+            break
+        chunk = np.frombuffer(data, dtype=np.float32).reshape(-1, CHANNELS)
+        remaining -= len(chunk)
+        yield chunk
+
+
+def normalized_gain(stats: ClipStats, target_dbfs: float) -> float:
+    """Gain that brings the RMS of the non-silent audio to target_dbfs, without clipping"""
+    if not stats.loud_samples or not stats.peak:
+        return 1.0
+    rms = np.sqrt(stats.loud_sum_squares / stats.loud_samples)
+    gain = 10 ** (target_dbfs / 20) / rms
+    return float(min(gain, PEAK_CEILING / stats.peak))
+
+
+def process_clip(chunks: Iterable[np.ndarray], normalize: bool = True, target_dbfs: float = -18.0,
+                 trim_silence: bool = True, silence_dbfs: float = -50.0, padding_ms: int = 50) -> Iterator[np.ndarray]:
+    """Normalize and trim one clip, yielding processed chunks"""
+    with tempfile.TemporaryFile() as spool_file:
+        stats = spool(chunks, spool_file, 10 ** (silence_dbfs / 20))
+
+        start, stop = 0, stats.frames
+        if trim_silence:
+            if stats.first_loud is None:
+                return
+            padding = int(SAMPLE_RATE * padding_ms / 1000)
+            start = max(0, stats.first_loud - padding)
+            stop = min(stats.frames, stats.last_loud + 1 + padding)
+
+        gain = normalized_gain(stats, target_dbfs) if normalize else 1.0
+        for chunk in read_spool(spool_file, start, stop):
+            yield chunk * np.float32(gain) if gain != 1.0 else chunk
+
+
+def crossfade_concat(clips: Iterable[Iterable[np.ndarray]], crossfade_ms: int = 30) -> Iterator[np.ndarray]:
+    """Join clips end to end, overlapping each boundary with an equal-power crossfade.
+
+    Only the last crossfade-length frames of the previous clip are held back,
+    so memory does not grow with clip length. A clip shorter than that
+    overlaps only the end of the previous one.
+    """
+    fade_frames = int(SAMPLE_RATE * crossfade_ms / 1000)
+    tail: Optional[np.ndarray] = None
+
+    for clip in clips:
+        chunks = iter(clip)
+        start = []
+        if tail is not None and len(tail):
+            # Read as much of this clip as the held tail is long
+            head = []
+            head_frames = 0
+            for chunk in chunks:
+                head.append(chunk)
+                head_frames += len(chunk)
+                if head_frames >= len(tail):
+                    break
+            if not head_frames:
+                # Empty clip: the next one crossfades with the same tail
+                continue
+            head = np.concatenate(head)
+            overlap = min(len(tail), len(head))
+            if len(tail) > overlap:
+                yield tail[:len(tail) - overlap]
+            t = (np.arange(overlap, dtype=np.float32) + 0.5) / overlap
+            fade_in = np.sin(t * np.pi / 2)[:, None]
+            fade_out = np.cos(t * np.pi / 2)[:, None]
+            start = [tail[len(tail) - overlap:] * fade_out + head[:overlap] * fade_in, head[overlap:]]
+
+        held = np.empty((0, CHANNELS), dtype=np.float32)
+        for chunk in itertools.chain(start, chunks):
+            if not len(chunk):
+                continue
+            # Hold back the last fade_frames of the clip for the next boundary
+            held = np.concatenate([held, chunk]) if len(held) else chunk
+            if len(held) > fade_frames:
+                yield held[:len(held) - fade_frames]
+                held = held[len(held) - fade_frames:]
+        tail = np.array(held, dtype=np.float32)
+
+    if tail is not None and len(tail):
+        yield tail
+
+
+def limit_duration(decoded: Iterable[Iterator[np.ndarray]], max_seconds: float) -> Iterator[Iterator[np.ndarray]]:
+    """Pass decoded clips through, raising ValueError once together they run over max_seconds"""
+    remaining = int(SAMPLE_RATE * max_seconds)
+
+    def counted(chunks):
+        nonlocal remaining
+        try:
+            for chunk in chunks:
+                remaining -= len(chunk)
+                if remaining < 0:
+                    raise ValueError(f"Audio to process is longer than {max_seconds:g} seconds")
+                yield chunk
+        finally:
+            chunks.close()
+
+    for chunks in decoded:
+        yield counted(chunks)
+
+
+def render(paths: List[str], out_path: str, crossfade_ms: int = 30, max_seconds: Optional[float] = None,
+           **clip_options):
+    """Decode, process and join the given audio files into one MP3 at out_path.
+
+    Raises ValueError if max_seconds is given and the inputs are longer in total.
+    """
+    decoded = (decode(path) for path in paths)
+    if max_seconds is not None:
+        decoded = limit_duration(decoded, max_seconds)
+    clips = (process_clip(chunks, **clip_options) for chunks in decoded)
+    encode_mp3(crossfade_concat(clips, crossfade_ms), out_path)
+
+
+def render_to_temp(paths: List[str], directory: str, **options) -> str:
+    """render() into a new file in directory, returning its path"""
+    fd, out_path = tempfile.mkstemp(suffix='.part', dir=directory)
+    os.close(fd)
+    try:
+        render(paths, out_path, **options)
+    except Exception:
+        os.remove(out_path)
+        raise
+    return out_path
+
+
+# MPEG audio Layer III bitrates (kbit/s) by header index, and sample rates by version
+_MPEG1_BITRATES = (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320)
+_MPEG2_BITRATES = (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160)
+_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+
+def _layer3_frame(header: bytes) -> Optional[Tuple[int, int]]:
+    """(frame length, offset of a Xing/Info tag) for an MP3 frame header, None if it is not one"""
+    value = int.from_bytes(header[:4], 'big')
+    version = (value >> 19) & 3
+    bitrate_index = (value >> 12) & 15
+    rate_index = (value >> 10) & 3
+    if value >> 21 != 0x7FF or version == 1 or (value >> 17) & 3 != 1 \
+            or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    mpeg1 = version == 3
+    bitrate = (_MPEG1_BITRATES if mpeg1 else _MPEG2_BITRATES)[bitrate_index] * 1000
+    length = (144 if mpeg1 else 72) * bitrate // _SAMPLE_RATES[version][rate_index] + ((value >> 9) & 1)
+    mono = (value >> 6) & 3 == 3
+    side_info = (17 if mono else 32) if mpeg1 else (9 if mono else 17)
+    return length, 4 + side_info
+
+
+def strip_mp3_headers(chunks: Iterable[bytes], keep_id3: bool = False) -> Iterator[bytes]:
+    """Pass MP3 bytes through without the leading ID3v2 tag and Xing/Info/VBRI header frame.
+
+    Those describe a whole file (title, duration, seek table); left in the
+    middle of MP3 files joined byte for byte they confuse players.
+    """
+    chunks = iter(chunks)
+    buffer = b''
+
+    def fill(size: int) -> bool:
+        nonlocal buffer
+        while len(buffer) < size:
+            chunk = next(chunks, None)
+            if chunk is None:
+                return False
+            buffer += chunk
+        return True
+
+    if fill(10) and buffer[:3] == b'ID3':
+        # Tag size is a 28-bit "syncsafe" integer, plus a footer if flagged
+        size = 10 + sum((byte & 0x7F) << (7 * (3 - i)) for i, byte in enumerate(buffer[6:10]))
+        size += 10 if buffer[5] & 0x10 else 0
+        # Cover art can make tags large, so they are passed on or skipped piecewise
+        while size and fill(1):
+            part, buffer = buffer[:size], buffer[size:]
+            size -= len(part)
+            if keep_id3:
+                yield part
+
+    frame = _layer3_frame(buffer[:4]) if fill(4) else None
+    if frame and fill(frame[0]):
+        length, tag_offset = frame
+        if buffer[tag_offset:tag_offset + 4] in (b'Xing', b'Info') or buffer[36:40] == b'VBRI':
+            buffer = buffer[length:]
+
+    if buffer:
+        yield buffer
+    yield from chunks
@@ -0,0 +1,242 @@
+"""
+Content-addressed on-disk store for generated audio.
+
+Clips are keyed by the id from make_audio_id() in app.py, so a stored file
+never changes and can be served with an immutable Cache-Control header.
+The upstream Murf URL of a clip is kept next to it so the bytes can be fetched
+lazily the first time somebody asks for them.
+
+When the store is full, clips are evicted by Greedy-Dual-Size-Frequency:
+each clip's priority is L + hits * cost / size, where cost is the Murf spend
+that produced it and L is the priority of the last clip evicted, so the store
+keeps the most Murf spend per byte while letting clips that stop being used
+age out.
+"""
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import requests
+
+from tracing import tracer
+
+
+class _Entry:
+    def __init__(self, size: int, cost: float):
+        self.size = size
+        self.cost = cost
+        self.hits = 1
+        self.priority = 0.0
+
+
+class AudioStore:
+    # Clips that cost no Murf spend (local engine, processed audio) still count
+    # as this much, so hits and size decide between them
+    MIN_COST = 1.0
+    # Partial files untouched for this long were left by a write that never
+    # finished; younger ones may belong to another worker still writing them
+    STALE_PART_SECONDS = 3600
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: Dict[str, _Entry] = {}
+        # (priority, seq, audio_id); stale items are skipped when popped
+        self._heap: List[Tuple[float, int, str]] = []
+        self._seq = itertools.count()
+        # GDSF inflation: priority of the last evicted clip
+        self._inflation = 0.0
+        self._total = 0
+        os.makedirs(root, exist_ok=True)
+        self._load()
+
+    def _index_path(self) -> str:
+        return os.path.join(self.root, 'index.json')
+
+    def _load(self):
+        # Hit counts saved by flush(); clips stored since then start from one
+        try:
+            with open(self._index_path()) as f:
+                hits = json.load(f)
+        except (OSError, ValueError):
+            hits = {}
+
+        now = time.time()
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.endswith('.part'):
+                try:
+                    if now - os.path.getmtime(path) > self.STALE_PART_SECONDS:
+                        os.remove(path)
+                except OSError:
+                    # Finished or removed by its writer meanwhile
+                    pass
+            elif name.endswith('.mp3'):
+                audio_id = name[:-4]
+                size = os.path.getsize(path)
+                self._entries[audio_id] = _Entry(size, self.source_cost(audio_id))
+                self._entries[audio_id].hits = hits.get(audio_id, 1)
+                self._total += size
+                self._prioritize(audio_id)
+
+    def flush(self):
+        """Save hit counts so eviction priorities survive a restart"""
+        with self._lock:
+            hits = {audio_id: entry.hits for audio_id, entry in self._entries.items()}
+        part = f"{self._index_path()}.part"
+        with open(part, 'w') as f:
+            json.dump(hits, f)
+        os.replace(part, self._index_path())
+
+    def path(self, audio_id: str) -> str:
+        return os.path.join(self.root, f"{audio_id}.mp3")
+
+    def _source_path(self, audio_id: str) -> str:
+        return os.path.join(self.root, f"{audio_id}.src")
+
+    def has(self, audio_id: str, hit: bool = True) -> bool:
+        """Whether a clip is stored; counts as a hit unless hit is False"""
+        with self._lock:
+            entry = self._entries.get(audio_id)
+            if entry is None:
+                return False
+            if hit:
+                entry.hits += 1
+                self._prioritize(audio_id)
+            return True
+
+    def register_source(self, audio_id: str, audio_url: str, cost: float = 0.0):
+        """Remember where a clip can be downloaded from and what it cost to generate"""
+        with open(self._source_path(audio_id), 'w') as f:
+            f.write(f"{audio_url}\n{cost}\n")
+
+    def _read_source(self, audio_id: str) -> List[str]:
+        try:
+            with open(self._source_path(audio_id)) as f:
+                return f.read().split()
+        except OSError:
+            return []
+
+    def source(self, audio_id: str) -> Optional[str]:
+        lines = self._read_source(audio_id)
+        return lines[0] if lines else None
+
+    def source_cost(self, audio_id: str) -> float:
+        """Generation cost recorded with the clip's source; older .src files have none"""
+        lines = self._read_source(audio_id)
+        try:
+            return float(lines[1])
+        except (IndexError, ValueError):
+            return 0.0
+
+    def put_stream(self, audio_id: str, chunks: Iterable[bytes], cost: Optional[float] = None) -> Iterator[bytes]:
+        """Write chunks to the store while passing them through to the caller.
+
+        The file only becomes visible once the whole stream has been written,
+        so a client that disconnects half way never leaves a truncated clip.
+        cost defaults to the one registered with the clip's source.
+        """
+        part = f"{self.path(audio_id)}.{threading.get_ident()}.part"
+        size = 0
+        complete = False
+        try:
+            with open(part, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    size += len(chunk)
+                    yield chunk
+            complete = True
+        finally:
+            if complete:
+                os.replace(part, self.path(audio_id))
+                self._add(audio_id, size, self.source_cost(audio_id) if cost is None else cost)
+            elif os.path.exists(part):
+                os.remove(part)
+
+    def put_bytes(self, audio_id: str, data: bytes, cost: Optional[float] = None):
+        for _ in self.put_stream(audio_id, [data], cost):
+            pass
+
+    def adopt(self, audio_id: str, path: str, cost: float = 0.0):
+        """Move a finished file (on the same filesystem) into the store"""
+        size = os.path.getsize(path)
+        os.replace(path, self.path(audio_id))
+        self._add(audio_id, size, cost)
+
+    def fetch(self, audio_id: str) -> Optional[str]:
+        """Return the local path of a clip, downloading it from its source if needed"""
+        if self.has(audio_id):
+            return self.path(audio_id)
+
+        audio_url = self.source(audio_id)
+        if not audio_url:
+            return None
+
+        with tracer.start_as_current_span('audio.download', attributes={'audio.id': audio_id}):
+            response = requests.get(audio_url, stream=True)
+            try:
+                if response.status_code != 200:
+                    return None
+                for _ in self.put_stream(audio_id, response.iter_content(chunk_size=64 * 1024)):
+                    pass
+            finally:
+                response.close()
+        return self.path(audio_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'clips': len(self._entries),
+                'bytes': self._total,
+                'max_bytes': self.max_bytes,
+                'cost_retained': sum(entry.cost for entry in self._entries.values())
+            }
+
+    def _prioritize(self, audio_id: str):
+        entry = self._entries[audio_id]
+        entry.priority = self._inflation + entry.hits * max(entry.cost, self.MIN_COST) / max(entry.size, 1)
+        heapq.heappush(self._heap, (entry.priority, next(self._seq), audio_id))
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            # Too many stale items from re-prioritized clips
+            self._heap = [(entry.priority, next(self._seq), audio_id) for audio_id, entry in self._entries.items()]
+            heapq.heapify(self._heap)
+
+    def _add(self, audio_id: str, size: int, cost: float):
+        with self._lock:
+            previous = self._entries.get(audio_id)
+            entry = _Entry(size, cost)
+            if previous is not None:
+                self._total -= previous.size
+                entry.hits = previous.hits
+            self._entries[audio_id] = entry
+            self._total += size
+            self._prioritize(audio_id)
+            self._evict(keep=audio_id)
+
+    def _evict(self, keep: str):
+        held = None
+        while self._total > self.max_bytes and len(self._entries) > 1 and self._heap:
+            item = heapq.heappop(self._heap)
+            priority, _, audio_id = item
+            entry = self._entries.get(audio_id)
+            if entry is None or entry.priority != priority:
+                continue
+            if audio_id == keep:
+                # Never evict the clip being added
+                held = item
+                continue
+            del self._entries[audio_id]
+            self._total -= entry.size
+            self._inflation = priority
+            # The .src file is kept so an evicted clip can still be re-fetched
+            try:
+                os.remove(self.path(audio_id))
+            except OSError:
+                pass
+        if held is not None:
+            heapq.heappush(self._heap, held)
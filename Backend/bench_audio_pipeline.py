@@ -0,0 +1,93 @@
+"""
+Throughput benchmark for the audio post-processing pipeline.
+
+Reports seconds of audio processed per CPU second for the NumPy stages
+(normalize + trim + crossfade join) on synthetic speech-like clips, and for
+the full decode/process/encode path when ffmpeg is installed.
+
+    python bench_audio_pipeline.py [--seconds 60] [--clips 3]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import wave
+
+import numpy as np
+
+from audio_pipeline import CHANNELS, CHUNK_FRAMES, SAMPLE_RATE, crossfade_concat, process_clip, render
+
+
+def synthetic_clip(seconds: float, seed: int) -> np.ndarray:
+    """Bursts of modulated noise separated by pauses, with silent edges"""
+    rng = np.random.default_rng(seed)
+    frames = int(seconds * SAMPLE_RATE)
+    t = np.arange(frames, dtype=np.float32) / SAMPLE_RATE
+    envelope = (np.sin(2 * np.pi * 3 * t) > -0.3).astype(np.float32) * rng.uniform(0.05, 0.5)
+    signal = rng.standard_normal(frames).astype(np.float32) * envelope * 0.3
+    edge = SAMPLE_RATE // 2
+    signal[:edge] = 0
+    signal[-edge:] = 0
+    return np.repeat(signal[:, None], CHANNELS, axis=1)
+
+
+def chunked(clip: np.ndarray):
+    for start in range(0, len(clip), CHUNK_FRAMES):
+        yield clip[start:start + CHUNK_FRAMES]
+
+
+def bench_numpy_stages(clips):
+    audio_seconds = sum(len(clip) for clip in clips) / SAMPLE_RATE
+    start = time.process_time()
+    frames = 0
+    for chunk in crossfade_concat((process_clip(chunked(clip)) for clip in clips), crossfade_ms=30):
+        frames += len(chunk)
+    cpu_seconds = time.process_time() - start
+    return audio_seconds, cpu_seconds, frames / SAMPLE_RATE
+
+
+def write_wav(path: str, clip: np.ndarray):
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(CHANNELS)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes((np.clip(clip, -1, 1) * 32767).astype('<i2').tobytes())
+
+
+def bench_full_render(clips):
+    """CPU time here includes the ffmpeg child processes"""
+    audio_seconds = sum(len(clip) for clip in clips) / SAMPLE_RATE
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for i, clip in enumerate(clips):
+            paths.append(os.path.join(directory, f"clip{i}.wav"))
+            write_wav(paths[-1], clip)
+
+        before = os.times()
+        render(paths, os.path.join(directory, 'out.mp3'))
+        after = os.times()
+    cpu_seconds = sum(after[:4]) - sum(before[:4])
+    return audio_seconds, cpu_seconds
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=60.0, help="length of each clip")
+    parser.add_argument('--clips', type=int, default=3, help="number of clips to join")
+    args = parser.parse_args()
+
+    clips = [synthetic_clip(args.seconds, seed) for seed in range(args.clips)]
+
+    print("Audio pipeline throughput")
+    print("=" * 50)
+    audio_seconds, cpu_seconds, output_seconds = bench_numpy_stages(clips)
+    print(f"NumPy stages: {audio_seconds:.1f}s of audio in {cpu_seconds:.3f} CPU s "
+          f"-> {audio_seconds / cpu_seconds:.1f} audio s / CPU s (output {output_seconds:.1f}s)")
+
+    if shutil.which('ffmpeg'):
+        audio_seconds, cpu_seconds = bench_full_render(clips)
+        print(f"Full render:  {audio_seconds:.1f}s of audio in {cpu_seconds:.3f} CPU s "
+              f"-> {audio_seconds / cpu_seconds:.1f} audio s / CPU s")
+    else:
+        print("Full render:  skipped (ffmpeg not installed)")
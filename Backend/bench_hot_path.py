@@ -0,0 +1,273 @@
+"""
+CPU benchmarks for the per-request code in app.py, with Murf mocked out.
+
+Covers request validation, voice lookup, the auto-translate check, the
+extraction of Murf's translation response, JSON serialization of the full
+response, and a whole /api/generate call through the middleware stack.
+Times are taken as the best of several rounds and divided by a fixed
+pure-Python calibration loop, measured again right before each benchmark
+so a change in machine load mid-run does not skew the later ones; this
+keeps the stored baselines comparable between machines. The app's data directory (audio store, history and usage
+databases) is put on tmpfs where there is one, so disk latency does not
+drown out the CPU work being measured, and removed on exit.
+
+    python bench_hot_path.py           compare against bench_baselines.json
+    python bench_hot_path.py --save    store the median of SAVE_RUNS runs as the baselines
+    BENCH_CHECK=1 pytest bench_hot_path.py
+                                       fail on a regression beyond BENCH_TOLERANCE
+
+Timings are noisy on shared machines, so under pytest the checks are
+skipped unless BENCH_CHECK=1 is set.
+"""
+import argparse
+import asyncio
+import atexit
+import contextlib
+import functools
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import types
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_baselines.json')
+# Allowed slowdown against the baseline before the pytest check fails
+TOLERANCE = float(os.getenv('BENCH_TOLERANCE', 0.5))
+# The pytest checks only run when asked for
+CHECK = os.getenv('BENCH_CHECK', '').lower() in ('1', 'true', 'yes')
+ROUNDS = 7
+# --save stores the median of this many runs, so one lucky run does not set the bar
+SAVE_RUNS = 5
+
+SENTENCE = "Your card is ready and the voice sounds friendly. "
+ENGLISH_TEXT = (SENTENCE * 10).strip()
+HINDI_TEXT = "आपका कार्ड तैयार है और आवाज़ दोस्ताना लगती है। " * 10
+
+
+class FakeMurf:
+    """Answers translate and TTS calls immediately, the way the Murf SDK shapes its responses"""
+
+    def __init__(self):
+        self.text = types.SimpleNamespace(translate=self.translate)
+        self.text_to_speech = types.SimpleNamespace(generate=self.generate)
+
+    def translate(self, target_language, texts):
+        return types.SimpleNamespace(translations=[
+            types.SimpleNamespace(source_text=text, translated_text=HINDI_TEXT) for text in texts
+        ])
+
+    def generate(self, **kwargs):
+        return types.SimpleNamespace(
+            audio_file=f"https://murf.example/{abs(hash(kwargs['text']))}.mp3",
+            consumed_character_count=len(kwargs['text'])
+        )
+
+
+@functools.lru_cache(maxsize=None)
+def load_app():
+    os.environ.setdefault('MURF_API_KEY', 'benchmark')
+    data_dir = tempfile.mkdtemp(prefix='bench-', dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+    atexit.register(shutil.rmtree, data_dir, ignore_errors=True)
+    os.environ['DATA_DIR'] = data_dir
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import app as backend
+
+    murf = FakeMurf()
+    backend.client = murf
+    backend.synthesis_router.backends[0].client = murf
+    return backend
+
+
+def calibrate() -> float:
+    """Seconds for a fixed pure-Python workload, the unit benchmarks are reported in"""
+    def workload():
+        total = 0
+        for i in range(20000):
+            total += len(str(i)) * (i % 7)
+        return total
+    return best_of(workload, 20)
+
+
+def best_of(func, number: int) -> float:
+    """Best per-call time over ROUNDS rounds of number calls"""
+    best = float('inf')
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def bench_validate_request(backend):
+    payload = {
+        'text': ENGLISH_TEXT, 'voice': 'Shaan', 'mood': 'Conversational', 'pitch': 0,
+        'translate': True, 'target_language': 'hi-IN', 'response_mode': 'full'
+    }
+    return lambda: backend.TextToSpeechRequest(**payload), 2000
+
+
+def bench_resolve_voice(backend):
+    return lambda: backend.resolve_voice('Shaan'), 20000
+
+
+def bench_auto_translate_check(backend):
+    request = backend.TextToSpeechRequest(text=ENGLISH_TEXT, voice='Shaan')
+    return lambda: backend.translation_target(request, 'hi-IN'), 5000
+
+
+def bench_translation_extraction(backend):
+    # Includes chunking and the usage ledger write around the (mocked) call
+    return lambda: backend.translate_text(ENGLISH_TEXT, 'hi-IN', 'benchmark', 'hi-IN-shaan'), 200
+
+
+def bench_serialize_response(backend):
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+
+    body = {
+        'id': '0' * 32, 'success': True, 'audio_url': 'https://murf.example/clip.mp3',
+        'original_text': ENGLISH_TEXT, 'translated_text': HINDI_TEXT, 'final_text': HINDI_TEXT,
+        'voice_language': 'hi-IN', 'translation_enabled': True, 'target_language': 'hi-IN',
+        'reused': False, 'message': 'Audio generated successfully'
+    }
+    return lambda: JSONResponse(jsonable_encoder(body)).body, 5000
+
+
+def bench_generate_request(backend):
+    """A whole /api/generate call, ASGI in to ASGI out, with a new text each time"""
+    counter = iter(range(10 ** 9))
+    loop = asyncio.new_event_loop()
+
+    async def call():
+        body = json.dumps({
+            'text': f"{ENGLISH_TEXT} {next(counter)}", 'voice': 'Shaan', 'response_mode': 'full'
+        }).encode()
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'POST',
+            'scheme': 'http', 'path': '/api/generate', 'raw_path': b'/api/generate', 'query_string': b'',
+            'root_path': '', 'client': ('127.0.0.1', 1234), 'server': ('testserver', 80),
+            'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())],
+        }
+        messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+        status = []
+
+        async def receive():
+            return messages.pop() if messages else {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+
+        await backend.app(scope, receive, send)
+        assert status == [200], status
+
+    def run():
+        # The endpoint prints debug lines for every request
+        with contextlib.redirect_stdout(io.StringIO()):
+            loop.run_until_complete(call())
+
+    return run, 50
+
+
+BENCHMARKS = {
+    'validate_request': bench_validate_request,
+    'resolve_voice': bench_resolve_voice,
+    'auto_translate_check': bench_auto_translate_check,
+    'translation_extraction': bench_translation_extraction,
+    'serialize_response': bench_serialize_response,
+    'generate_request': bench_generate_request,
+}
+
+
+def run_benchmarks() -> dict:
+    backend = load_app()
+    results = {}
+    for name, setup in BENCHMARKS.items():
+        func, number = setup(backend)
+        func()  # warm up
+        unit = calibrate()
+        seconds = best_of(func, number)
+        results[name] = {'microseconds': round(seconds * 1e6, 3), 'relative': float(f"{seconds / unit:.4g}")}
+    return results
+
+
+def load_baselines() -> dict:
+    try:
+        with open(BASELINE_PATH) as f:
+            return json.load(f)
+    except OSError:
+        return {}
+
+
+@functools.lru_cache(maxsize=None)
+def cached_results() -> dict:
+    return run_benchmarks()
+
+
+def check(name: str):
+    import pytest
+    if not CHECK:
+        pytest.skip("timing checks are opt-in; set BENCH_CHECK=1")
+    baseline = load_baselines().get(name)
+    if baseline is None:
+        pytest.skip(f"no baseline for {name}; run python bench_hot_path.py --save")
+    result = cached_results()[name]
+    limit = baseline['relative'] * (1 + TOLERANCE)
+    assert result['relative'] <= limit, \
+        f"{name} regressed: {result['relative']} calibration units per call, baseline {baseline['relative']}"
+
+
+def test_validate_request():
+    check('validate_request')
+
+
+def test_resolve_voice():
+    check('resolve_voice')
+
+
+def test_auto_translate_check():
+    check('auto_translate_check')
+
+
+def test_translation_extraction():
+    check('translation_extraction')
+
+
+def test_serialize_response():
+    check('serialize_response')
+
+
+def test_generate_request():
+    check('generate_request')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--save', action='store_true', help="store the results as the new baselines")
+    args = parser.parse_args()
+
+    results = run_benchmarks()
+    if args.save:
+        runs = [results] + [run_benchmarks() for _ in range(SAVE_RUNS - 1)]
+        results = {name: sorted((run[name] for run in runs), key=lambda result: result['relative'])[len(runs) // 2]
+                   for name in results}
+    baselines = load_baselines()
+
+    print("Request hot path (best of %d rounds)" % ROUNDS)
+    print("=" * 64)
+    for name, result in results.items():
+        line = f"{name:<24} {result['microseconds']:>10.2f} us  {result['relative']:>10.4g} units"
+        if name in baselines:
+            change = result['relative'] / baselines[name]['relative'] - 1
+            line += f"  {change:+.0%} vs baseline"
+        print(line)
+
+    if args.save:
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Saved baselines to {os.path.basename(BASELINE_PATH)}")
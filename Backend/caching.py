@@ -0,0 +1,165 @@
+"""
+HTTP caching and compression middleware.
+
+Adds per-route Cache-Control, ETag and Last-Modified headers to GET
+responses, answers conditional requests with 304 Not Modified, and compresses
+JSON bodies with brotli (when the optional `brotli` package is installed) or
+gzip. Together these let a CDN in front of the backend absorb most reads.
+"""
+import gzip
+import hashlib
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from fnmatch import fnmatch
+from typing import List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+
+COMPRESSIBLE_TYPES = ('application/json', 'text/')
+
+
+class CachingMiddleware:
+    """
+    policies: list of (path glob, Cache-Control value), first match wins.
+    Responses that already carry an ETag (e.g. content-addressed audio) are
+    passed through untouched apart from the conditional check; other matched
+    responses are buffered so an ETag can be derived from the body.
+    """
+
+    def __init__(self, app, policies: List[Tuple[str, str]], minimum_size: int = 500,
+                 last_modified: Optional[float] = None):
+        self.app = app
+        self.policies = policies
+        self.minimum_size = minimum_size
+        self.last_modified = formatdate(last_modified or time.time(), usegmt=True)
+
+    def policy_for(self, path: str) -> Optional[str]:
+        for pattern, cache_control in self.policies:
+            if fnmatch(path, pattern):
+                return cache_control
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['method'] != 'GET':
+            await self.app(scope, receive, send)
+            return
+
+        cache_control = self.policy_for(scope['path'])
+        if cache_control is None:
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = {k.decode('latin-1'): v.decode('latin-1') for k, v in scope['headers']}
+        start = {}
+        body = []
+        state = {'passthrough': False, 'not_modified': False}
+
+        async def send_wrapper(message):
+            if state['not_modified']:
+                # Swallow the body of a response we already answered with 304
+                return
+
+            if message['type'] == 'http.response.start':
+                headers = dict((k.decode('latin-1').lower(), v.decode('latin-1')) for k, v in message['headers'])
+                if message['status'] != 200:
+                    state['passthrough'] = True
+                    await send(message)
+                    return
+
+                if 'etag' in headers:
+                    state['passthrough'] = True
+                    headers['cache-control'] = cache_control
+                    if self._not_modified(request_headers, headers['etag'], headers.get('last-modified')):
+                        state['not_modified'] = True
+                        await self._send_304(send, headers)
+                        return
+                    message['headers'] = _encode_headers(headers)
+                    await send(message)
+                    return
+
+                start.update(message)
+                start['headers'] = headers
+                return
+
+            if state['passthrough']:
+                await send(message)
+                return
+
+            body.append(message.get('body', b''))
+            if message.get('more_body', False):
+                return
+
+            await self._send_buffered(send, start, b''.join(body), request_headers, cache_control)
+
+        await self.app(scope, receive, send_wrapper)
+
+    def _not_modified(self, request_headers: dict, etag: str, last_modified: Optional[str]) -> bool:
+        if_none_match = request_headers.get('if-none-match')
+        if if_none_match is not None:
+            candidates = [tag.strip() for tag in if_none_match.split(',')]
+            # Weak comparison, as required for If-None-Match
+            return '*' in candidates or _strip_weak(etag) in {_strip_weak(tag) for tag in candidates}
+
+        if_modified_since = request_headers.get('if-modified-since')
+        if if_modified_since and last_modified:
+            try:
+                return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    async def _send_304(self, send, headers: dict):
+        keep = ('cache-control', 'etag', 'last-modified', 'vary', 'expires')
+        await send({
+            'type': 'http.response.start',
+            'status': 304,
+            'headers': _encode_headers({k: v for k, v in headers.items() if k in keep}),
+        })
+        await send({'type': 'http.response.body', 'body': b''})
+
+    async def _send_buffered(self, send, start: dict, body: bytes, request_headers: dict, cache_control: str):
+        headers = start['headers']
+        headers['cache-control'] = cache_control
+        headers.setdefault('last-modified', self.last_modified)
+
+        encoding = None
+        content_type = headers.get('content-type', '')
+        if len(body) >= self.minimum_size and content_type.startswith(COMPRESSIBLE_TYPES) \
+                and 'content-encoding' not in headers:
+            headers['vary'] = 'Accept-Encoding'
+            accept_encoding = request_headers.get('accept-encoding', '')
+            if brotli is not None and 'br' in accept_encoding:
+                encoding = 'br'
+            elif 'gzip' in accept_encoding:
+                encoding = 'gzip'
+
+        # The ETag names the representation, so it differs per content encoding
+        digest = hashlib.sha1(body).hexdigest()
+        headers['etag'] = '"%s-%s"' % (digest, encoding) if encoding else '"%s"' % digest
+
+        if self._not_modified(request_headers, headers['etag'], headers['last-modified']):
+            await self._send_304(send, headers)
+            return
+
+        if encoding == 'br':
+            body = brotli.compress(body)
+        elif encoding == 'gzip':
+            body = gzip.compress(body, compresslevel=6)
+        if encoding:
+            headers['content-encoding'] = encoding
+
+        headers['content-length'] = str(len(body))
+        await send({'type': 'http.response.start', 'status': start['status'], 'headers': _encode_headers(headers)})
+        await send({'type': 'http.response.body', 'body': body})
+
+
+def _strip_weak(etag: str) -> str:
+    return etag[2:] if etag.startswith('W/') else etag
+
+
+def _encode_headers(headers: dict) -> list:
+    return [(k.encode('latin-1'), v.encode('latin-1')) for k, v in headers.items()]
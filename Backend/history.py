@@ -0,0 +1,160 @@
+"""
+Generation history: an append-only JSON-lines log plus an SQLite index.
+
+The log is the source of truth and is only ever appended to; the SQLite
+database indexes it by generation parameters (for dedup before calling Murf)
+and by creation time (for listing), and is rebuilt from the log if missing.
+Whether a clip reached a caller is only kept in the database; after a rebuild
+every recent clip counts as undelivered once.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Tuple
+
+COLUMNS = (
+    'id', 'created_at', 'tenant', 'text_hash', 'voice', 'mood', 'pitch', 'language', 'lexicon',
+    'backend', 'original_text', 'translated_text', 'final_text', 'audio_url'
+)
+
+
+def hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def hash_tenant(api_key: Optional[str]) -> str:
+    """History never stores raw API keys"""
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:16] if api_key else 'anonymous'
+
+
+class GenerationHistory:
+    def __init__(self, root: str):
+        os.makedirs(root, exist_ok=True)
+        self.log_path = os.path.join(root, 'history.jsonl')
+        db_path = os.path.join(root, 'history.sqlite3')
+        rebuild = not os.path.exists(db_path)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('''
+            CREATE TABLE IF NOT EXISTS generations (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                id TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                tenant TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                voice TEXT NOT NULL,
+                mood TEXT,
+                pitch INTEGER,
+                language TEXT NOT NULL,
+                lexicon TEXT,
+                backend TEXT,
+                original_text TEXT,
+                translated_text TEXT,
+                final_text TEXT,
+                audio_url TEXT,
+                delivered INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        # Columns added after the first release
+        existing = {row['name'] for row in self._db.execute('PRAGMA table_info(generations)')}
+        for column, definition in (('lexicon', 'TEXT'), ('backend', 'TEXT'),
+                                   ('delivered', 'INTEGER NOT NULL DEFAULT 0')):
+            if column not in existing:
+                self._db.execute(f'ALTER TABLE generations ADD COLUMN {column} {definition}')
+        self._db.execute('''
+            CREATE INDEX IF NOT EXISTS idx_generations_lookup
+            ON generations (text_hash, voice, mood, pitch, language, created_at)
+        ''')
+        self._db.execute('CREATE INDEX IF NOT EXISTS idx_generations_created ON generations (created_at)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS idx_generations_tenant ON generations (tenant, seq)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS idx_generations_id ON generations (id)')
+        self._db.commit()
+
+        if rebuild and os.path.exists(self.log_path):
+            self._rebuild()
+        self._log = open(self.log_path, 'a', encoding='utf-8')
+
+    def _rebuild(self):
+        with open(self.log_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    self._insert(json.loads(line))
+                except (ValueError, KeyError):
+                    # A torn last line from a crash is skipped, not fatal
+                    continue
+        self._db.commit()
+
+    def _insert(self, entry: dict):
+        self._db.execute(
+            f"INSERT INTO generations ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+            [entry.get(column) for column in COLUMNS]
+        )
+
+    def record(self, entry: dict) -> dict:
+        """Append a finished generation to the log and the index"""
+        entry = dict(entry, created_at=entry.get('created_at') or time.time())
+        with self._lock:
+            self._log.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            self._log.flush()
+            self._insert(entry)
+            self._db.commit()
+        return entry
+
+    def lookup(self, text_hash: str, voice: str, mood: Optional[str], pitch: Optional[int],
+               language: str, lexicon: Optional[str], backend: str, max_age: float) -> Optional[dict]:
+        """Most recent generation with exactly these parameters, if younger than max_age seconds"""
+        with self._lock:
+            row = self._db.execute('''
+                SELECT * FROM generations
+                WHERE text_hash = ? AND voice = ? AND mood IS ? AND pitch IS ? AND language = ?
+                  AND lexicon IS ? AND backend = ? AND created_at >= ?
+                ORDER BY created_at DESC LIMIT 1
+            ''', (text_hash, voice, mood, pitch, language, lexicon, backend, time.time() - max_age)).fetchone()
+        return dict(row) if row else None
+
+    def page(self, tenant: str, cursor: Optional[int], limit: int,
+             since: Optional[float] = None) -> Tuple[List[dict], Optional[int]]:
+        """Newest-first page of a tenant's generations; returns (items, next cursor)"""
+        query = 'SELECT * FROM generations WHERE tenant = ?'
+        params = [tenant]
+        if cursor is not None:
+            query += ' AND seq < ?'
+            params.append(cursor)
+        if since is not None:
+            query += ' AND created_at >= ?'
+            params.append(since)
+        query += ' ORDER BY seq DESC LIMIT ?'
+        params.append(limit + 1)
+
+        with self._lock:
+            rows = [dict(row) for row in self._db.execute(query, params)]
+
+        next_cursor = rows[limit - 1]['seq'] if len(rows) > limit else None
+        return rows[:limit], next_cursor
+
+    def mark_delivered(self, audio_id: str):
+        """Note that a caller received the clip, so it need not be recovered"""
+        with self._lock:
+            self._db.execute('UPDATE generations SET delivered = 1 WHERE id = ? AND delivered = 0', (audio_id,))
+            self._db.commit()
+
+    def undelivered(self, since: float, limit: int) -> List[str]:
+        """Newest-first ids of clips created since the given time that no caller received"""
+        with self._lock:
+            return [row['id'] for row in self._db.execute(
+                'SELECT id FROM generations WHERE created_at >= ? GROUP BY id HAVING MAX(delivered) = 0 '
+                'ORDER BY MAX(created_at) DESC LIMIT ?',
+                (since, limit)
+            )]
+
+    def close(self):
+        with self._lock:
+            self._log.close()
+            self._db.close()
@@ -0,0 +1,265 @@
+"""
+Pronunciation lexicon and SSML-style preprocessing for text sent to TTS.
+
+The lexicon maps words (typically names on greeting cards) to respellings
+that the voice pronounces correctly, e.g. {"Chirag": "Chi-raag"}. It is
+compiled into an Aho-Corasick automaton so applying it is linear in the text
+length no matter how many entries there are, and it is reloaded from disk
+whenever the file changes.
+
+Supported tags:
+    <break time="500ms"/>                       -> Murf pause, [pause 0.5s]
+    <sub alias="Doctor">Dr.</sub>               -> the alias, as-is
+    <say-as interpret-as="characters">AI</say-as> -> "A I"
+Any other tag is dropped and its text kept.
+
+Text that is translated before synthesis goes through protect() first: tags
+and lexicon words are swapped for [[n]] placeholders that the translation
+leaves alone, and restore() puts them back, so both still apply afterwards.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+TAG_PATTERN = re.compile(
+    r'<break\s+time\s*=\s*"(?P<time>[\d.]+)\s*(?P<unit>ms|s)"\s*/?>'
+    r'|<sub\s+alias\s*=\s*"(?P<alias>[^"]*)"\s*>(?P<sub>.*?)</sub\s*>'
+    r'|<say-as\s+interpret-as\s*=\s*"(?P<interpret>[^"]*)"\s*>(?P<say>.*?)</say-as\s*>'
+    r'|</?[a-zA-Z][\w-]*(?:\s[^<>]*)?/?>',
+    re.DOTALL
+)
+PLACEHOLDER_PATTERN = re.compile(r'\[\[\s*(\d+)\s*\]\]')
+
+
+def _fold(char: str) -> str:
+    # Lowercase one character to one character, so match offsets line up
+    # with the original text even for characters like "İ"
+    return char.lower()[:1] or char
+
+
+def _is_word_char(char: str) -> bool:
+    # Combining marks count as part of a word so Devanagari matras do not
+    # create false word boundaries
+    return char.isalnum() or char == '_' or unicodedata.category(char).startswith('M')
+
+
+class AhoCorasick:
+    """Multi-pattern matcher; patterns are matched case-insensitively"""
+
+    def __init__(self, patterns: List[str]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        # Per state, indexes of the patterns that end there
+        self.output: List[List[int]] = [[]]
+        self.lengths = [len(pattern) for pattern in patterns]
+
+        for index, pattern in enumerate(patterns):
+            state = 0
+            for char in map(_fold, pattern):
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][char] = next_state
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                state = next_state
+            self.output[state].append(index)
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+
+    def iter_matches(self, text: str):
+        """Yield (start, end, pattern index) for every occurrence in text"""
+        state = 0
+        for position, char in enumerate(map(_fold, text)):
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            for index in self.output[state]:
+                yield position + 1 - self.lengths[index], position + 1, index
+
+
+class Lexicon:
+    def __init__(self, path: str, check_interval: float = 1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+        self._compiled: Tuple[Dict[str, str], List[str], Optional[AhoCorasick], str] = ({}, [], None, 'empty')
+        self.reload()
+
+    @property
+    def entries(self) -> Dict[str, str]:
+        self.maybe_reload()
+        return dict(self._compiled[0])
+
+    @property
+    def version(self) -> str:
+        """Fingerprint of the current entries, part of the TTS cache key"""
+        self.maybe_reload()
+        return self._compiled[3]
+
+    def maybe_reload(self):
+        """Recompile if the file changed; stats the file at most once per check_interval"""
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            mtime = None
+        if mtime != self._mtime:
+            self.reload()
+
+    def reload(self):
+        with self._lock:
+            try:
+                mtime = os.stat(self.path).st_mtime
+                with open(self.path, encoding='utf-8') as f:
+                    data = json.load(f)
+            except FileNotFoundError:
+                mtime, data = None, {}
+            except (OSError, ValueError) as e:
+                # Keep serving the previous lexicon if the file is mid-edit or broken
+                print(f"Lexicon reload failed: {e}")
+                return
+
+            if not isinstance(data, dict) or not all(
+                    isinstance(word, str) and isinstance(spoken, str) for word, spoken in data.items()):
+                # Keep serving the previous lexicon rather than failing later in apply()
+                print(f"Lexicon reload failed: {self.path} must be a JSON object of word -> respelling")
+                return
+
+            entries = {word: spoken for word, spoken in data.items() if word.strip()}
+            words = list(entries)
+            automaton = AhoCorasick(words) if words else None
+            digest = hashlib.sha256(json.dumps(entries, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+            version = digest.hexdigest()[:12] if entries else 'empty'
+            # Swap in one assignment so readers never see a half-built lexicon
+            self._compiled = (entries, words, automaton, version)
+            self._mtime = mtime
+            self._checked_at = time.monotonic()
+
+    def update(self, changes: Dict[str, Optional[str]]):
+        """Add/replace entries, or delete those mapped to None, and save the file"""
+        with self._write_lock:
+            entries = dict(self._compiled[0])
+            for word, spoken in changes.items():
+                if spoken is None:
+                    entries.pop(word, None)
+                else:
+                    entries[word] = spoken
+
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(entries, f, ensure_ascii=False, indent=2, sort_keys=True)
+            os.replace(temp_path, self.path)
+            self.reload()
+
+    def _matches(self, text: str):
+        """Yield (start, end, respelling) of whole-word lexicon matches, leftmost-longest first"""
+        entries, words, automaton, _ = self._compiled
+        if automaton is None:
+            return
+
+        last = 0
+        for start, end, index in sorted(automaton.iter_matches(text), key=lambda m: (m[0], m[0] - m[1])):
+            if start < last:
+                continue
+            if start > 0 and _is_word_char(text[start - 1]):
+                continue
+            if end < len(text) and _is_word_char(text[end]):
+                continue
+            yield start, end, entries[words[index]]
+            last = end
+
+    def apply(self, text: str) -> str:
+        """Replace whole-word lexicon matches, leftmost-longest first"""
+        self.maybe_reload()
+        parts = []
+        last = 0
+        for start, end, spoken in self._matches(text):
+            parts.append(text[last:start])
+            parts.append(spoken)
+            last = end
+        parts.append(text[last:])
+        return ''.join(parts)
+
+    def protect(self, text: str) -> Tuple[str, List[str]]:
+        """Swap tags and lexicon words for [[n]] placeholders; returns (text, originals)"""
+        self.maybe_reload()
+        originals: List[str] = []
+
+        def hold(fragment: str) -> str:
+            originals.append(fragment)
+            return f"[[{len(originals) - 1}]]"
+
+        def protect_words(segment: str) -> str:
+            parts = []
+            last = 0
+            for start, end, _ in self._matches(segment):
+                parts.append(segment[last:start])
+                parts.append(hold(segment[start:end]))
+                last = end
+            parts.append(segment[last:])
+            return ''.join(parts)
+
+        parts = []
+        last = 0
+        for match in TAG_PATTERN.finditer(text):
+            parts.append(protect_words(text[last:match.start()]))
+            parts.append(hold(match.group(0)))
+            last = match.end()
+        parts.append(protect_words(text[last:]))
+        return ''.join(parts), originals
+
+    @staticmethod
+    def restore(text: str, originals: List[str]) -> str:
+        """Put back what protect() took out; placeholders the translation invented are dropped"""
+        def original(match):
+            index = int(match.group(1))
+            return originals[index] if index < len(originals) else ''
+        return PLACEHOLDER_PATTERN.sub(original, text)
+
+    def preprocess(self, text: str) -> str:
+        """Expand SSML-style tags and apply the lexicon to everything else"""
+        if '<' not in text:
+            return self.apply(text)
+
+        parts = []
+        last = 0
+        for match in TAG_PATTERN.finditer(text):
+            parts.append(self.apply(text[last:match.start()]))
+            last = match.end()
+            if match.group('time'):
+                seconds = float(match.group('time')) / (1000 if match.group('unit') == 'ms' else 1)
+                parts.append(f" [pause {seconds:g}s] ")
+            elif match.group('alias') is not None:
+                parts.append(match.group('alias'))
+            elif match.group('interpret') is not None:
+                inner = match.group('say')
+                if match.group('interpret') in ('characters', 'spell-out'):
+                    parts.append(' '.join(char for char in inner if not char.isspace()))
+                else:
+                    parts.append(self.apply(inner))
+        parts.append(self.apply(text[last:]))
+        return ''.join(parts)
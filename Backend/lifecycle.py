@@ -0,0 +1,109 @@
+"""
+Graceful shutdown: admission control and draining of in-flight work.
+
+Lifecycle counts the requests and WebSocket sessions being served and keeps
+the generation tasks that must finish even if their caller goes away (Murf
+has already been paid for them). Once draining starts, DrainMiddleware turns
+new requests away with 503 and drain() waits for what is running, up to a
+deadline.
+"""
+import asyncio
+import json
+import time
+from typing import Set
+
+
+class Lifecycle:
+    def __init__(self):
+        self.draining = False
+        self.active = 0
+        self._tasks: Set[asyncio.Task] = set()
+
+    def start_draining(self):
+        self.draining = True
+
+    def finish(self, coro):
+        """Run coro to completion even if the awaiting request is cancelled.
+
+        The caller awaits the result as usual; if it is cancelled instead, the
+        task keeps running and drain() waits for it.
+        """
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._done)
+        return asyncio.shield(task)
+
+    def _done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled():
+            # Nobody may be left to see it; don't let asyncio log it as unretrieved
+            task.exception()
+
+    async def drain(self, timeout: float) -> bool:
+        """Wait for in-flight requests and generations; False if the deadline passed first"""
+        self.draining = True
+        deadline = time.monotonic() + timeout
+        while self.active or self._tasks:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            if self._tasks:
+                await asyncio.wait(set(self._tasks), timeout=min(remaining, 0.1))
+            else:
+                await asyncio.sleep(min(remaining, 0.05))
+        return True
+
+    async def cancel(self, timeout: float) -> int:
+        """Cancel the generations still running and wait up to timeout for them to stop.
+
+        A generation blocked in a worker thread only stops once that call
+        returns. Returns how many were still running when cancelled.
+        """
+        tasks = set(self._tasks)
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.wait(tasks, timeout=timeout)
+        return len(tasks)
+
+    def stats(self) -> dict:
+        return {'draining': self.draining, 'active': self.active, 'generations': len(self._tasks)}
+
+
+class DrainMiddleware:
+    """Counts in-flight requests and refuses new ones with 503 while draining"""
+
+    def __init__(self, app, lifecycle: Lifecycle, retry_after: int = 5):
+        self.app = app
+        self.lifecycle = lifecycle
+        self.retry_after = retry_after
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] not in ('http', 'websocket'):
+            await self.app(scope, receive, send)
+            return
+
+        if self.lifecycle.draining:
+            if scope['type'] == 'websocket':
+                # 1012: service restart
+                await send({'type': 'websocket.close', 'code': 1012})
+                return
+            body = json.dumps({'detail': "Server is shutting down"}).encode('utf-8')
+            await send({
+                'type': 'http.response.start',
+                'status': 503,
+                'headers': [
+                    (b'content-type', b'application/json'),
+                    (b'content-length', str(len(body)).encode()),
+                    (b'retry-after', str(self.retry_after).encode()),
+                    (b'connection', b'close'),
+                ],
+            })
+            await send({'type': 'http.response.body', 'body': body})
+            return
+
+        self.lifecycle.active += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.lifecycle.active -= 1
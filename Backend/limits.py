@@ -0,0 +1,104 @@
+"""
+Request size limits and text chunking.
+
+BodyLimitMiddleware rejects bodies over a byte limit with 413, checking the
+Content-Length up front and counting bytes as they stream in, so an oversized
+upload is never buffered whole. chunk_text() splits long texts at sentence
+boundaries so they can be translated and synthesized in several calls.
+"""
+import json
+import re
+from typing import List
+
+# Sentence ends: Latin punctuation and the Devanagari danda
+SENTENCE_END = re.compile(r'(?<=[.!?।॥])\s+')
+
+
+class _BodyTooLarge(Exception):
+    pass
+
+
+class BodyLimitMiddleware:
+    def __init__(self, app, max_body_bytes: int):
+        self.app = app
+        self.max_body_bytes = max_body_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope['headers']:
+            if name == b'content-length':
+                try:
+                    too_large = int(value) > self.max_body_bytes
+                except ValueError:
+                    too_large = False
+                if too_large:
+                    await self._send_413(send)
+                    return
+
+        state = {'received': 0, 'exceeded': False, 'started': False}
+
+        async def limited_receive():
+            message = await receive()
+            if message['type'] == 'http.request':
+                state['received'] += len(message.get('body', b''))
+                if state['received'] > self.max_body_bytes:
+                    state['exceeded'] = True
+                    raise _BodyTooLarge()
+            return message
+
+        async def guarded_send(message):
+            if state['exceeded']:
+                # The app turned the aborted read into its own error; answer 413 instead
+                if message['type'] == 'http.response.start' and not state['started']:
+                    state['started'] = True
+                    await self._send_413(send)
+                return
+            if message['type'] == 'http.response.start':
+                state['started'] = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except _BodyTooLarge:
+            if not state['started']:
+                await self._send_413(send)
+
+    async def _send_413(self, send):
+        body = json.dumps({'detail': f"Request body exceeds {self.max_body_bytes} bytes"}).encode('utf-8')
+        await send({
+            'type': 'http.response.start',
+            'status': 413,
+            'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())],
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+
+def chunk_text(text: str, max_chars: int) -> List[str]:
+    """Split text into pieces of at most max_chars, preferring sentence then word boundaries"""
+    if len(text) <= max_chars:
+        return [text]
+
+    chunks = []
+    current = ''
+    for sentence in SENTENCE_END.split(text):
+        while len(sentence) > max_chars:
+            # A single sentence longer than the limit: cut at the last space that fits
+            cut = sentence.rfind(' ', 0, max_chars + 1)
+            if cut <= 0:
+                cut = max_chars
+            if current:
+                chunks.append(current)
+                current = ''
+            chunks.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            chunks.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        chunks.append(current)
+    return [chunk for chunk in chunks if chunk]
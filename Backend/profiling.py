@@ -0,0 +1,179 @@
+"""
+Sampling profiler for the running backend.
+
+A background thread snapshots the Python stacks of the other threads with
+sys._current_frames() every few milliseconds and counts identical stacks.
+Results are in the folded format read by flamegraph.pl, speedscope and
+inferno: one "frame;frame;frame count" line per distinct stack, outermost
+frame first, with the thread name as the root frame.
+
+Nothing runs unless a profile has been asked for: either for the whole
+process for some seconds, or for single requests that opt in with an
+X-Profile header (see ProfilingMiddleware).
+"""
+import asyncio
+import hmac
+import os
+import sys
+import threading
+import uuid
+from collections import Counter, OrderedDict
+from contextvars import ContextVar
+from typing import Optional
+
+# The per-request sampler of the request being handled, if it is being profiled
+_current_sampler: ContextVar = ContextVar('profile_sampler', default=None)
+
+
+def fold_stack(frame) -> str:
+    labels = []
+    while frame is not None:
+        code = frame.f_code
+        labels.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+class Sampler:
+    """Samples the stacks of every other thread until stopped"""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.counts: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def include(self, thread_id: int) -> bool:
+        return True
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> str:
+        self._stop.set()
+        self._thread.join()
+        return self.folded()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or not self.include(thread_id):
+                    continue
+                self.counts[f"{names.get(thread_id, thread_id)};{fold_stack(frame)}"] += 1
+            self.samples += 1
+
+    def folded(self) -> str:
+        return ''.join(f"{stack} {count}\n" for stack, count in self.counts.most_common())
+
+
+class RequestSampler(Sampler):
+    """
+    Samples only the work of one request: the event loop thread while one of
+    the request's tasks is running on it, and worker threads while they run a
+    function wrapped with profiled() on the request's behalf.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        super().__init__(interval)
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread = threading.get_ident()
+        self.task = asyncio.current_task()
+        self.threads = set()
+
+    def include(self, thread_id):
+        if thread_id in self.threads:
+            return True
+        if thread_id != self.loop_thread:
+            return False
+        task = asyncio.current_task(self.loop)
+        if task is None:
+            return False
+        if task is self.task:
+            return True
+        # Tasks the request spawned (gather, streaming bodies) inherit its context
+        get_context = getattr(task, 'get_context', None)
+        return get_context is not None and get_context().get(_current_sampler) is self
+
+
+def profiled(func):
+    """Wrap a function about to run in a worker thread so a profiled request samples that thread"""
+    sampler = _current_sampler.get()
+    if sampler is None:
+        return func
+
+    def run(*args, **kwargs):
+        thread_id = threading.get_ident()
+        sampler.threads.add(thread_id)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            sampler.threads.discard(thread_id)
+
+    return run
+
+
+async def profile_process(seconds: float, interval: float = 0.005) -> str:
+    """Sample every thread of the process for the given time, returning folded stacks"""
+    sampler = Sampler(interval)
+    sampler.start()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        folded = sampler.stop()
+    return folded
+
+
+def is_admin(token: Optional[str], admin_token: Optional[str]) -> bool:
+    return bool(admin_token and token and hmac.compare_digest(token, admin_token))
+
+
+class ProfilingMiddleware:
+    """
+    Profiles single requests to the given paths that send "X-Profile: 1"
+    together with a valid X-Admin-Token. The response gets an X-Profile-Id
+    header; the folded stacks are kept in `profiles` (newest max_profiles)
+    once the response has been sent.
+    """
+
+    def __init__(self, app, paths, admin_token: Optional[str], profiles: "OrderedDict[str, str]",
+                 max_profiles: int = 20, interval: float = 0.005):
+        self.app = app
+        self.paths = set(paths)
+        self.admin_token = admin_token
+        self.profiles = profiles
+        self.max_profiles = max_profiles
+        self.interval = interval
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not self.admin_token or scope['path'] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope['headers'])
+        if headers.get(b'x-profile') != b'1' or \
+                not is_admin(headers.get(b'x-admin-token', b'').decode('latin-1'), self.admin_token):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = uuid.uuid4().hex
+
+        async def send_with_id(message):
+            if message['type'] == 'http.response.start':
+                message = dict(message, headers=list(message.get('headers', [])) +
+                               [(b'x-profile-id', profile_id.encode('ascii'))])
+            await send(message)
+
+        sampler = RequestSampler(self.interval)
+        token = _current_sampler.set(sampler)
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            _current_sampler.reset(token)
+            self.profiles[profile_id] = sampler.stop()
+            while len(self.profiles) > self.max_profiles:
+                self.profiles.popitem(last=False)
@@ -0,0 +1,152 @@
+"""
+Priority and fair-share scheduling for Murf calls.
+
+Every translate/synthesize call takes a slot from the scheduler first. Slots
+are handed out in strict priority order across classes (interactive before
+batch before precompute), each class has its own concurrency cap, and inside
+a class tenants (API keys) share capacity by weighted fair queuing, so one
+tenant's bulk campaign cannot starve everyone else.
+
+The scheduler takes tenant names as given and does not authenticate them;
+app.py decides which caller-supplied keys count as tenants of their own.
+"""
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+PRIORITY_CLASSES = ('interactive', 'batch', 'precompute')
+
+# Upper bounds (seconds) of the wait-time histogram buckets
+WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Tenants seen per class before idle ones are forgotten
+TENANT_PRUNE_MIN = 1024
+
+
+def parse_weights(value: Optional[str]) -> Dict[str, float]:
+    """Parse "name:number,name:number" config strings"""
+    weights = {}
+    for item in (value or '').split(','):
+        name, _, number = item.strip().rpartition(':')
+        if name:
+            weights[name] = float(number)
+    return weights
+
+
+class _PriorityClass:
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = limit
+        self.running = 0
+        self.waiting = 0
+        self.queue = []  # heap of (finish tag, seq, future)
+        self.virtual_time = 0.0
+        self.last_finish: Dict[str, float] = {}
+        self.prune_at = TENANT_PRUNE_MIN
+        self.wait_counts = [0] * (len(WAIT_BUCKETS) + 1)
+        self.wait_sum = 0.0
+        self.wait_count = 0
+
+    def observe_wait(self, seconds: float):
+        for i, bound in enumerate(WAIT_BUCKETS):
+            if seconds <= bound:
+                self.wait_counts[i] += 1
+                break
+        else:
+            self.wait_counts[-1] += 1
+        self.wait_sum += seconds
+        self.wait_count += 1
+
+
+class GenerationScheduler:
+    def __init__(self, class_limits: Dict[str, int], total_limit: int,
+                 tenant_weights: Optional[Dict[str, float]] = None, default_weight: float = 1.0):
+        self.classes = {name: _PriorityClass(name, int(class_limits.get(name, 1))) for name in PRIORITY_CLASSES}
+        self.total_limit = total_limit
+        self.tenant_weights = tenant_weights or {}
+        self.default_weight = default_weight
+        self._seq = itertools.count()
+        self._running = 0
+
+    @asynccontextmanager
+    async def slot(self, priority: Optional[str], tenant: Optional[str], cost: float = 1.0):
+        """Wait for a slot in the given class; cost is the job size (e.g. characters)"""
+        cls = self.classes.get(priority or 'interactive', self.classes['interactive'])
+        tenant = tenant or 'anonymous'
+        weight = self.tenant_weights.get(tenant, self.default_weight)
+
+        # Weighted fair queuing: a tenant's jobs are tagged with a virtual
+        # finish time that advances by cost / weight per job
+        start = max(cls.virtual_time, cls.last_finish.get(tenant, 0.0))
+        finish = start + max(cost, 1.0) / weight
+        cls.last_finish[tenant] = finish
+        if len(cls.last_finish) >= cls.prune_at:
+            self._prune(cls)
+
+        future = asyncio.get_running_loop().create_future()
+        enqueued_at = time.monotonic()
+        heapq.heappush(cls.queue, (finish, next(self._seq), future))
+        cls.waiting += 1
+        self._dispatch()
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just as we were cancelled: hand the slot back
+                self._release(cls)
+            else:
+                cls.waiting -= 1
+            raise
+
+        cls.observe_wait(time.monotonic() - enqueued_at)
+        try:
+            yield
+        finally:
+            self._release(cls)
+
+    def _prune(self, cls: _PriorityClass):
+        # A tenant whose last finish tag the virtual clock has passed starts
+        # from the clock anyway, so forgetting it changes nothing
+        cls.last_finish = {tenant: finish for tenant, finish in cls.last_finish.items()
+                           if finish > cls.virtual_time}
+        cls.prune_at = max(TENANT_PRUNE_MIN, 2 * len(cls.last_finish))
+
+    def _release(self, cls: _PriorityClass):
+        cls.running -= 1
+        self._running -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        for cls in self.classes.values():
+            while cls.queue and cls.running < cls.limit and self._running < self.total_limit:
+                finish, _, future = heapq.heappop(cls.queue)
+                if future.done():
+                    continue
+                cls.virtual_time = finish
+                cls.waiting -= 1
+                cls.running += 1
+                self._running += 1
+                future.set_result(None)
+
+    def stats(self) -> dict:
+        classes = {}
+        for cls in self.classes.values():
+            buckets = {}
+            cumulative = 0
+            for bound, count in zip(WAIT_BUCKETS + ('+Inf',), cls.wait_counts):
+                cumulative += count
+                buckets[str(bound)] = cumulative
+            classes[cls.name] = {
+                'limit': cls.limit,
+                'running': cls.running,
+                'queue_depth': cls.waiting,
+                'wait_seconds': {
+                    'buckets': buckets,
+                    'sum': round(cls.wait_sum, 6),
+                    'count': cls.wait_count
+                }
+            }
+        return {'total_limit': self.total_limit, 'running': self._running, 'classes': classes}
@@ -0,0 +1,229 @@
+"""
+Pluggable speech synthesis backends and the router that picks one per request.
+
+MurfBackend is the normal engine. LocalBackend runs espeak-ng on the server's
+CPU and is only meant for degraded mode, when Murf is failing, too slow for
+the request's latency budget or too expensive for its cost cap. Anything with
+the same synthesize() method can be plugged in, which also allows
+deterministic offline tests and benchmarks.
+"""
+import re
+import shutil
+import subprocess
+import threading
+import time
+from typing import List, Optional
+from xml.sax.saxutils import escape
+
+from tracing import tracer
+
+
+class SynthesisError(RuntimeError):
+    pass
+
+
+class SynthesisResult:
+    """Either a URL the audio can be downloaded from, or the MP3 bytes themselves"""
+
+    def __init__(self, backend: str, audio_url: Optional[str] = None, audio_bytes: Optional[bytes] = None,
+                 characters: int = 0):
+        self.backend = backend
+        self.audio_url = audio_url
+        self.audio_bytes = audio_bytes
+        self.characters = characters
+        # characters * the backend's cost_per_char, filled in by SynthesisRouter
+        self.cost = 0.0
+
+
+class SynthesisBackend:
+    name = 'base'
+    # Relative cost of one character of input, compared against the request's cost cap
+    cost_per_char = 0.0
+
+    def available(self) -> bool:
+        return True
+
+    def synthesize(self, text: str, voice_id: str, mood: Optional[str], pitch: Optional[int],
+                   language: Optional[str]) -> SynthesisResult:
+        raise NotImplementedError
+
+
+class MurfBackend(SynthesisBackend):
+    name = 'murf'
+
+    def __init__(self, client, cost_per_char: float = 1.0):
+        self.client = client
+        self.cost_per_char = cost_per_char
+
+    def synthesize(self, text, voice_id, mood, pitch, language):
+        response = self.client.text_to_speech.generate(
+            format="MP3",
+            sample_rate=48000.0,
+            channel_type="STEREO",
+            text=text,
+            voice_id=voice_id,
+            style=mood,
+            pitch=pitch
+        )
+
+        audio_url = response.audio_file if hasattr(response, "audio_file") else None
+        if not audio_url:
+            raise SynthesisError("Failed to generate audio")
+        characters = getattr(response, 'consumed_character_count', None) or len(text)
+        return SynthesisResult(self.name, audio_url=audio_url, characters=characters)
+
+
+class LocalBackend(SynthesisBackend):
+    """espeak-ng piped through ffmpeg; robotic, but works with no network"""
+    name = 'local'
+
+    # espeak-ng voices for the languages our Murf voices speak
+    VOICES = {'hi-IN': 'hi', 'en-IN': 'en-gb', 'en-US': 'en-us'}
+    # Pauses as Lexicon.preprocess() writes them for Murf
+    PAUSE_PATTERN = re.compile(r'\s*\[pause (\d+(?:\.\d+)?)s\]\s*')
+
+    def __init__(self, timeout: float = 30.0):
+        self.timeout = timeout
+        self.espeak = shutil.which('espeak-ng') or shutil.which('espeak')
+        self.ffmpeg = shutil.which('ffmpeg')
+
+    def available(self):
+        return bool(self.espeak and self.ffmpeg)
+
+    def synthesize(self, text, voice_id, mood, pitch, language):
+        if not self.available():
+            raise SynthesisError("Local TTS needs espeak-ng and ffmpeg installed")
+
+        # Murf pitch is a percentage around 0, espeak's is 0-99 around 50
+        espeak_pitch = max(0, min(99, 50 + (pitch or 0)))
+        # The text goes on stdin so user input can never be read as an option
+        wav = subprocess.run(
+            [self.espeak, '-v', self.VOICES.get(language, 'en'), '-p', str(espeak_pitch), '-m', '--stdout', '--stdin'],
+            input=self.to_ssml(text).encode('utf-8'), capture_output=True, timeout=self.timeout, check=True
+        ).stdout
+        mp3 = subprocess.run(
+            [self.ffmpeg, '-v', 'error', '-i', 'pipe:0', '-ar', '48000', '-ac', '2',
+             '-codec:a', 'libmp3lame', '-b:a', '128k', '-f', 'mp3', 'pipe:1'],
+            input=wav, capture_output=True, timeout=self.timeout, check=True
+        ).stdout
+        return SynthesisResult(self.name, audio_bytes=mp3, characters=len(text))
+
+    @classmethod
+    def to_ssml(cls, text: str) -> str:
+        """Escape text for espeak's SSML mode, turning [pause Xs] markers into breaks instead of words"""
+        parts = cls.PAUSE_PATTERN.split(text)
+        markup = [escape(parts[0])]
+        for seconds, following in zip(parts[1::2], parts[2::2]):
+            markup.append(f' <break time="{round(float(seconds) * 1000)}ms"/> {escape(following)}')
+        return ''.join(markup)
+
+
+class _BackendHealth:
+    def __init__(self):
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+        self.latency_ewma: Optional[float] = None
+        self.successes = 0
+        self.failures = 0
+
+
+class SynthesisRouter:
+    """
+    Picks a backend per request, in preference order, skipping backends that
+    are unavailable, marked unhealthy after repeated failures (until their
+    cooldown ends), expected to exceed the request's latency budget, or more
+    expensive than its cost cap. Falls through to the next candidate if the
+    chosen backend fails.
+    """
+
+    def __init__(self, backends: List[SynthesisBackend], failure_threshold: int = 3,
+                 cooldown_seconds: float = 30.0, max_cost: Optional[float] = None):
+        self.backends = backends
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.max_cost = max_cost
+        self._lock = threading.Lock()
+        self._health = {backend.name: _BackendHealth() for backend in backends}
+
+    @property
+    def primary(self) -> str:
+        return self.backends[0].name
+
+    def candidates(self, characters: int, latency_budget: Optional[float] = None) -> List[SynthesisBackend]:
+        now = time.monotonic()
+        healthy = [
+            backend for backend in self.backends
+            if backend.available() and self._health[backend.name].unhealthy_until <= now
+        ]
+
+        def fits(backend):
+            health = self._health[backend.name]
+            if latency_budget is not None and health.latency_ewma is not None \
+                    and health.latency_ewma > latency_budget:
+                return False
+            if self.max_cost is not None and backend.cost_per_char * characters > self.max_cost:
+                return False
+            return True
+
+        preferred = [backend for backend in healthy if fits(backend)]
+        # Nothing fits the budget: better a slow or costly clip than none
+        return preferred + [backend for backend in healthy if backend not in preferred]
+
+    def synthesize(self, text: str, voice_id: str, mood: Optional[str], pitch: Optional[int],
+                   language: Optional[str], latency_budget: Optional[float] = None,
+                   backend: Optional[str] = None) -> SynthesisResult:
+        """Synthesize with the first candidate that succeeds, or only with the named backend"""
+        if backend is None:
+            candidates = self.candidates(len(text), latency_budget)
+        else:
+            candidates = [candidate for candidate in self.backends if candidate.name == backend]
+        if not candidates:
+            raise SynthesisError("No speech synthesis backend is available")
+
+        last_error = None
+        for backend in candidates:
+            started = time.monotonic()
+            try:
+                with tracer.start_as_current_span(f'synthesis.{backend.name}', attributes={
+                    'synthesis.backend': backend.name,
+                    'synthesis.voice_id': voice_id,
+                    'synthesis.characters': len(text)
+                }):
+                    result = backend.synthesize(text, voice_id, mood, pitch, language)
+            except Exception as e:
+                print(f"Synthesis with {backend.name} failed: {e}")
+                self._record(backend.name, None)
+                last_error = e
+                continue
+            self._record(backend.name, time.monotonic() - started)
+            result.cost = backend.cost_per_char * result.characters
+            return result
+        raise SynthesisError(str(last_error))
+
+    def _record(self, name: str, latency: Optional[float]):
+        with self._lock:
+            health = self._health[name]
+            if latency is None:
+                health.failures += 1
+                health.consecutive_failures += 1
+                if health.consecutive_failures >= self.failure_threshold:
+                    health.unhealthy_until = time.monotonic() + self.cooldown_seconds
+                return
+            health.successes += 1
+            health.consecutive_failures = 0
+            health.unhealthy_until = 0.0
+            health.latency_ewma = latency if health.latency_ewma is None else 0.7 * health.latency_ewma + 0.3 * latency
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            backend.name: {
+                'available': backend.available(),
+                'healthy': self._health[backend.name].unhealthy_until <= now,
+                'latency_ewma_seconds': self._health[backend.name].latency_ewma,
+                'successes': self._health[backend.name].successes,
+                'failures': self._health[backend.name].failures,
+                'cost_per_char': backend.cost_per_char
+            }
+            for backend in self.backends
+        }
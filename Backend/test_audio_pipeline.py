@@ -0,0 +1,94 @@
+"""
+Checks for crossfade_concat, limit_duration and strip_mp3_headers in audio_pipeline.
+
+Clips are constant-valued so every output frame shows which clips it came
+from, and MP3 files are built from bare frame headers; no ffmpeg is needed.
+
+    python test_audio_pipeline.py        (or run it with pytest)
+"""
+import numpy as np
+
+from audio_pipeline import CHANNELS, SAMPLE_RATE, crossfade_concat, limit_duration, strip_mp3_headers
+
+CROSSFADE_MS = 30
+FADE_FRAMES = int(SAMPLE_RATE * CROSSFADE_MS / 1000)
+
+
+def clip(value: float, frames: int, chunk_frames: int = 1000):
+    data = np.full((frames, CHANNELS), value, dtype=np.float32)
+    return [data[start:start + chunk_frames] for start in range(0, frames, chunk_frames)]
+
+
+def join(*clips) -> np.ndarray:
+    return np.concatenate(list(crossfade_concat(clips, CROSSFADE_MS)))[:, 0]
+
+
+def test_long_clips_overlap_by_the_crossfade():
+    out = join(clip(1.0, 10000), clip(3.0, 10000))
+    assert len(out) == 20000 - FADE_FRAMES
+    assert np.all(out[:10000 - FADE_FRAMES] == 1.0)
+    assert np.all(out[10000:] == 3.0)
+
+
+def test_short_clip_overlaps_only_the_end_of_the_previous_one():
+    short = 100
+    out = join(clip(1.0, 10000), clip(2.0, short, chunk_frames=30), clip(3.0, 10000))
+    # The short clip overlaps the first clip by its own length, the third clip by that again
+    assert len(out) == 10000 + short + 10000 - short - short
+    # Nothing of the first clip plays unmixed once the short clip has started
+    first_mixed = int(np.argmax(out != 1.0))
+    assert first_mixed == 10000 - short
+    assert not np.any(out[first_mixed:] == 1.0)
+    assert np.all(out[10000:] == 3.0)
+
+
+def test_empty_clip_is_skipped():
+    out = join(clip(1.0, 10000), [], clip(3.0, 10000))
+    assert len(out) == 20000 - FADE_FRAMES
+
+
+def test_limit_duration_counts_all_clips():
+    decoded = lambda: [(chunk for chunk in clip(1.0, SAMPLE_RATE)) for _ in range(3)]
+    assert sum(len(chunk) for chunks in limit_duration(decoded(), 3) for chunk in chunks) == 3 * SAMPLE_RATE
+    try:
+        for chunks in limit_duration(decoded(), 2.5):
+            for _ in chunks:
+                pass
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("clips over the limit were passed through")
+
+
+# MPEG1 Layer III, 128 kbit/s, 44.1 kHz, stereo: 417-byte frames
+FRAME_HEADER = bytes([0xFF, 0xFB, 0x90, 0x00])
+FRAME_LENGTH = 417
+
+
+def mp3_file(tag: bytes, info: bool, frames: int) -> bytes:
+    id3 = b'ID3\x04\x00\x00' + bytes([0, 0, 0, len(tag)]) + tag
+    info_frame = FRAME_HEADER + bytes(32) + b'Info' + bytes(FRAME_LENGTH - 40) if info else b''
+    audio = (FRAME_HEADER + b'\x55' * (FRAME_LENGTH - 4)) * frames
+    return id3 + info_frame + audio
+
+
+def split(data: bytes, size: int = 7):
+    return [data[start:start + size] for start in range(0, len(data), size)]
+
+
+def test_strip_mp3_headers():
+    audio = (FRAME_HEADER + b'\x55' * (FRAME_LENGTH - 4)) * 3
+    data = mp3_file(b'title', info=True, frames=3)
+    assert b''.join(strip_mp3_headers(split(data))) == audio
+    kept = b''.join(strip_mp3_headers(split(data), keep_id3=True))
+    assert kept.startswith(b'ID3') and kept.endswith(audio) and b'Info' not in kept
+    # Files without a tag or header frame, or too short to hold one, pass through unchanged
+    assert b''.join(strip_mp3_headers(split(audio))) == audio
+    assert b''.join(strip_mp3_headers([b'ID3abc'])) == b'ID3abc'
+
+
+if __name__ == '__main__':
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"{name}: ok")
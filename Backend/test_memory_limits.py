@@ -0,0 +1,131 @@
+"""
+Memory profile of /api/generate as the input text grows.
+
+Each text size runs in its own child process with Murf replaced by a fake
+that returns several megabytes of audio per synthesized chunk. The child
+reports how much its peak RSS grew over the request; the test checks the
+growth stays flat, i.e. long texts are chunked and their audio is streamed
+through the store instead of being held in memory.
+
+    python test_memory_limits.py        (or run it with pytest)
+"""
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+TEXT_SIZES = [1000, 5000, 20000]
+# Fake audio returned for every synthesized chunk
+AUDIO_BYTES_PER_CHUNK = 8 * 1024 * 1024
+# Allowed peak RSS growth between the smallest and the largest text
+MAX_GROWTH_MB = 16
+
+
+class FakeAudioResponse:
+    status_code = 200
+
+    def __init__(self, size: int):
+        self.size = size
+        self.headers = {'Content-Length': str(size)}
+
+    def iter_content(self, chunk_size=1024):
+        block = b'\x00' * chunk_size
+        for start in range(0, self.size, chunk_size):
+            yield block[:min(chunk_size, self.size - start)]
+
+    def close(self):
+        pass
+
+
+def run_child(size: int):
+    # DATA_DIR is a temporary directory set up (and removed) by measure()
+    os.environ.setdefault('MURF_API_KEY', 'test')
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    import asyncio
+    import app as backend
+    from synthesis import SynthesisBackend, SynthesisResult
+
+    class FakeMurf(SynthesisBackend):
+        name = 'murf'
+
+        def synthesize(self, text, voice_id, mood, pitch, language):
+            return SynthesisResult(self.name, audio_url=f"https://murf.example/{len(text)}.mp3",
+                                   characters=len(text))
+
+    backend.synthesis_router.backends = [FakeMurf()]
+    backend.synthesis_router._health = {'murf': backend.synthesis_router._health['murf']}
+    backend.requests.get = lambda *args, **kwargs: FakeAudioResponse(AUDIO_BYTES_PER_CHUNK)
+
+    def generate(text):
+        """Call the ASGI app directly; the test client would buffer the whole response"""
+        body = json.dumps({'text': text, 'voice': 'Shaan', 'translate': False, 'response_mode': 'audio'}).encode()
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'POST',
+            'scheme': 'http', 'path': '/api/generate', 'raw_path': b'/api/generate', 'query_string': b'',
+            'root_path': '', 'client': ('127.0.0.1', 1234), 'server': ('testserver', 80),
+            'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())],
+        }
+        messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+        state = {'status': None, 'received': 0}
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            await asyncio.sleep(3600)
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                state['status'] = message['status']
+            elif message['type'] == 'http.response.body':
+                state['received'] += len(message.get('body', b''))
+
+        asyncio.run(backend.app(scope, receive, send))
+        assert state['status'] == 200, state
+        return state['received']
+
+    # Warm up imports and the first request before measuring
+    generate('Warm up.')
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    sentence = 'This sentence is repeated to make a long text. '
+    text = (sentence * (size // len(sentence) + 1))[:size]
+    received = generate(text)
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    print(json.dumps({'size': size, 'received': received, 'growth_kb': after - before}))
+
+
+def measure(size: int) -> dict:
+    with tempfile.TemporaryDirectory() as data_dir:
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child', str(size)],
+            capture_output=True, text=True, check=True, env=dict(os.environ, DATA_DIR=data_dir)
+        ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def test_peak_memory_is_flat_in_text_size():
+    results = [measure(size) for size in TEXT_SIZES]
+    for result in results:
+        # Bigger texts really did produce more audio
+        assert result['received'] >= AUDIO_BYTES_PER_CHUNK
+    assert results[-1]['received'] > results[0]['received']
+
+    growth_mb = (results[-1]['growth_kb'] - results[0]['growth_kb']) / 1024
+    assert growth_mb < MAX_GROWTH_MB, results
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3 and sys.argv[1] == '--child':
+        run_child(int(sys.argv[2]))
+        sys.exit(0)
+
+    print("Peak RSS growth per request")
+    print("=" * 50)
+    for size in TEXT_SIZES:
+        result = measure(size)
+        print(f"{result['size']:>6} chars: {result['received'] / 2 ** 20:6.1f} MB of audio, "
+              f"peak RSS +{result['growth_kb'] / 1024:.1f} MB")
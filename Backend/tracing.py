@@ -0,0 +1,61 @@
+"""
+OpenTelemetry tracing.
+
+Spans go through the opentelemetry API, which does nothing until an exporter
+is configured: OTEL_EXPORTER_OTLP_ENDPOINT sends them to a collector over
+OTLP/HTTP, TRACE_FILE appends them to a file as JSON lines (both need
+opentelemetry-sdk, the collector also opentelemetry-exporter-otlp-proto-http).
+
+FastAPI itself opens a server span per request on the global provider,
+continuing the trace from the caller's traceparent header, so the frontend's
+spans, the handler's and the Murf call and download spans opened with
+`tracer` end up in one waterfall.
+"""
+import os
+
+from opentelemetry import trace
+
+try:
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+except ImportError:
+    TracerProvider = None
+
+tracer = trace.get_tracer('murf-voice')
+
+
+def configure_tracing(service_name: str) -> bool:
+    """Install an exporting tracer provider if one is configured; True if spans are exported"""
+    endpoint = os.getenv('OTEL_EXPORTER_OTLP_ENDPOINT')
+    trace_file = os.getenv('TRACE_FILE')
+    if not endpoint and not trace_file:
+        return False
+    if TracerProvider is None:
+        print("Tracing is configured but opentelemetry-sdk is not installed")
+        return False
+
+    provider = TracerProvider(resource=Resource.create({'service.name': service_name}))
+    if endpoint:
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        except ImportError:
+            print("OTLP export needs opentelemetry-exporter-otlp-proto-http installed")
+        else:
+            # Reads the endpoint and headers from the standard OTEL_* variables
+            provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    if trace_file:
+        exporter = ConsoleSpanExporter(
+            out=open(trace_file, 'a', encoding='utf-8'),
+            formatter=lambda span: span.to_json(indent=None) + '\n'
+        )
+        provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+    return True
+
+
+def shutdown_tracing():
+    """Export spans still buffered in the batch processors"""
+    shutdown = getattr(trace.get_tracer_provider(), 'shutdown', None)
+    if shutdown is not None:
+        shutdown()
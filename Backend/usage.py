@@ -0,0 +1,84 @@
+"""
+Murf usage ledger.
+
+Every translate and synthesize call is recorded with the characters it sent,
+its relative cost, the call type, voice, backend, language and tenant, in an
+SQLite table that can be totalled by any of those.
+"""
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Tuple
+
+GROUP_COLUMNS = ('call_type', 'voice', 'backend', 'language', 'tenant')
+
+
+class UsageLedger:
+    def __init__(self, root: str):
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(root, 'usage.sqlite3'), check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('''
+            CREATE TABLE IF NOT EXISTS usage (
+                created_at REAL NOT NULL,
+                tenant TEXT NOT NULL,
+                call_type TEXT NOT NULL,
+                voice TEXT,
+                backend TEXT NOT NULL,
+                language TEXT,
+                characters INTEGER NOT NULL,
+                cost REAL NOT NULL
+            )
+        ''')
+        self._db.execute('CREATE INDEX IF NOT EXISTS idx_usage_tenant ON usage (tenant, created_at)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS idx_usage_created ON usage (created_at)')
+        self._db.commit()
+
+    def record(self, tenant: str, call_type: str, voice: Optional[str], backend: str,
+               characters: int, cost: float, language: Optional[str] = None):
+        with self._lock:
+            self._db.execute(
+                'INSERT INTO usage (created_at, tenant, call_type, voice, backend, language, characters, cost) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (time.time(), tenant, call_type, voice, backend, language, characters, cost)
+            )
+            self._db.commit()
+
+    def totals(self, group_by: List[str], tenant: Optional[str] = None,
+               since: Optional[float] = None) -> Tuple[dict, List[dict]]:
+        """Overall totals and totals per distinct combination of the group_by columns.
+
+        Only the given tenant's calls are counted if tenant is set.
+        """
+        for column in group_by:
+            if column not in GROUP_COLUMNS:
+                raise ValueError(f"Cannot group usage by {column}")
+
+        where, params = [], []
+        if tenant is not None:
+            where.append('tenant = ?')
+            params.append(tenant)
+        if since is not None:
+            where.append('created_at >= ?')
+            params.append(since)
+        where_sql = f" WHERE {' AND '.join(where)}" if where else ''
+        sums = 'COUNT(*) AS calls, COALESCE(SUM(characters), 0) AS characters, COALESCE(SUM(cost), 0) AS cost'
+
+        with self._lock:
+            overall = dict(self._db.execute(f'SELECT {sums} FROM usage{where_sql}', params).fetchone())
+            groups = []
+            if group_by:
+                columns = ', '.join(group_by)
+                groups = [dict(row) for row in self._db.execute(
+                    f'SELECT {columns}, {sums} FROM usage{where_sql} GROUP BY {columns} ORDER BY cost DESC',
+                    params
+                )]
+        return overall, groups
+
+    def close(self):
+        with self._lock:
+            self._db.close()
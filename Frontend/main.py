@@ -6,9 +6,14 @@ import sys
 import tempfile
 import base64
 from io import BytesIO
+from urllib.parse import unquote
 from qr import generate_qr_png
+from tracing import client_span, configure_tracing, trace_headers, tracer
 from st_copy_to_clipboard import st_copy_to_clipboard
 
+# Export traces if OTEL_EXPORTER_OTLP_ENDPOINT or TRACE_FILE is set
+configure_tracing(os.getenv('OTEL_SERVICE_NAME', 'murf-voice-frontend'))
+
 # Configure Streamlit page
 st.set_page_config(
     page_title="AI FriendZone",
@@ -53,6 +58,10 @@ st.markdown("""
 # Backend API configuration
 BACKEND_URL = "https://murf-voice-2.onrender.com"
 
+# Longer texts are generated in "full" response mode: their translation may not
+# fit in a response header, which is how "audio" mode returns it
+AUDIO_MODE_MAX_CHARS = 200
+
 # Voice configurations (matching the backend - Hindi voices)
 # VOICE_MOODS = {
 #     "Shaan": ['Conversational', 'Promo', 'Calm', 'Sad'],
@@ -91,7 +100,8 @@ TRANSLATION_LANGUAGES = {
 def get_voices():
     """Fetch available voices from backend"""
     try:
-        response = requests.get(f"{BACKEND_URL}/api/voices")
+        with client_span('GET /api/voices'):
+            response = requests.get(f"{BACKEND_URL}/api/voices", headers=trace_headers())
         if response.status_code == 200:
             data = response.json()
             if data.get('success'):
@@ -101,7 +111,12 @@ def get_voices():
     return VOICE_MOODS
 
 def generate_audio(text, voice, mood, pitch, translate=False, target_language=None):
-    """Generate audio using the backend API with optional translation"""
+    """Generate audio using the backend API with optional translation.
+
+    Short texts use the backend's "audio" response mode so the MP3 bytes come
+    back in the same round-trip; the metadata arrives in X-* headers. Longer
+    ones use "full" mode and the audio is downloaded from the returned URL.
+    """
     try:
         payload = {
             "text": text,
@@ -109,34 +124,107 @@ def generate_audio(text, voice, mood, pitch, translate=False, target_language=No
             "mood": mood,
             "pitch": pitch,
             "translate": translate,
-            "target_language": target_language
+            "target_language": target_language,
+            "response_mode": "audio" if len(text) <= AUDIO_MODE_MAX_CHARS else "full"
         }
         
-        response = requests.post(
-            f"{BACKEND_URL}/api/generate",
-            json=payload,
-            headers={"Content-Type": "application/json"}
-        )
-        
-        if response.status_code == 200:
-            return response.json()
-        else:
-            st.error(f"Error: {response.status_code} - {response.text}")
-            return None
+        # The span covers the whole round-trip including the audio body
+        with client_span('POST /api/generate'):
+            response = requests.post(
+                f"{BACKEND_URL}/api/generate",
+                json=payload,
+                headers=trace_headers({"Content-Type": "application/json"}),
+                stream=True
+            )
+            
+            if response.status_code != 200:
+                st.error(f"Error: {response.status_code} - {response.text}")
+                return None
+            
+            if payload["response_mode"] == "full":
+                return response.json()
+            
+            translated_text = response.headers.get('X-Translated-Text')
+            translated_text = unquote(translated_text) if translated_text else None
+            audio_file = save_audio_stream(response)
+            if response.headers.get('X-Translated-Text-Omitted'):
+                # Translation too long for a header: ask again in full mode,
+                # which reuses the clip just generated
+                full = requests.post(
+                    f"{BACKEND_URL}/api/generate",
+                    json=dict(payload, response_mode="full"),
+                    headers=trace_headers({"Content-Type": "application/json"})
+                )
+                translated_text = full.json().get('translated_text') if full.status_code == 200 else None
+            return {
+                'success': True,
+                'id': response.headers.get('X-Audio-Id'),
+                'audio_url': response.headers.get('X-Audio-Url'),
+                'audio_file': audio_file,
+                'original_text': text,
+                'translated_text': translated_text,
+                'voice_language': response.headers.get('X-Voice-Language')
+            }
             
     except requests.exceptions.RequestException as e:
         st.error(f"Failed to connect to backend: {e}")
         return None
 
+def generate_variants(text, voice, moods, pitches, translate=False, target_language=None):
+    """Yield mood/pitch variants from the backend as each one finishes"""
+    payload = {
+        "text": text,
+        "voice": voice,
+        "moods": moods,
+        "pitches": pitches,
+        "translate": translate,
+        "target_language": target_language
+    }
+    
+    # Not made current: the caller's code runs between the lines this yields
+    span = tracer.start_span('POST /api/generate/variants')
+    try:
+        with requests.post(f"{BACKEND_URL}/api/generate/variants", json=payload,
+                           headers=trace_headers(span=span), stream=True) as response:
+            if response.status_code != 200:
+                st.error(f"Error: {response.status_code} - {response.text}")
+                return
+            for line in response.iter_lines():
+                if line:
+                    yield json.loads(line)
+    except requests.exceptions.RequestException as e:
+        st.error(f"Failed to connect to backend: {e}")
+    finally:
+        span.end()
+
+def save_audio_stream(response):
+    """Write an audio response to a temp file chunk by chunk, returning its path.
+
+    Only the latest clip is kept; the previous one is deleted.
+    """
+    previous = st.session_state.get('audio_file')
+    if previous and os.path.exists(previous):
+        os.remove(previous)
+    
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as temp_file:
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            temp_file.write(chunk)
+    
+    st.session_state.audio_file = temp_file.name
+    return temp_file.name
+
 def download_audio(audio_url):
-    """Download audio file from URL"""
+    """Download audio file from URL to a temp file, returning its path"""
+    if audio_url.startswith('/'):
+        # Clips the backend stores itself are returned as paths on the backend
+        audio_url = f"{BACKEND_URL}{audio_url}"
     try:
-        response = requests.get(audio_url, stream=True)
-        if response.status_code == 200:
-            return response.content
-        else:
-            st.error("Failed to download audio file")
-            return None
+        with client_span('audio.download'):
+            response = requests.get(audio_url, stream=True, headers=trace_headers())
+            if response.status_code == 200:
+                return save_audio_stream(response)
+        st.error("Failed to download audio file")
+        return None
     except requests.exceptions.RequestException as e:
         st.error(f"Error downloading audio: {e}")
         return None
@@ -301,6 +389,48 @@ def main():
             help="Adjust the pitch of the voice. Negative values = lower pitch, Positive values = higher pitch"
         )
         
+        # Variant preview grid: one column per pitch, one row per mood
+        with st.expander("🎛️ Preview Mood & Pitch Variants"):
+            preview_pitches = st.multiselect(
+                "Pitches to compare (%)",
+                options=list(range(-30, 35, 5)),
+                default=[-10, 0, 10],
+                help="Every mood of the selected voice is generated at each of these pitches"
+            )
+            
+            if st.button("🎛️ Preview Variants"):
+                if not text_input.strip():
+                    st.error("Please enter some text to convert to speech.")
+                elif not preview_pitches:
+                    st.error("Please pick at least one pitch.")
+                else:
+                    preview_pitches = sorted(preview_pitches)
+                    columns = st.columns(len(preview_pitches))
+                    cells = {}
+                    for column, pitch in zip(columns, preview_pitches):
+                        column.markdown(f"**Pitch {pitch:+d}%**")
+                        for mood in available_moods:
+                            cells[(mood, pitch)] = column.empty()
+                            cells[(mood, pitch)].caption(f"{mood}: generating...")
+                    
+                    for variant in generate_variants(
+                        text_input,
+                        selected_voice,
+                        available_moods,
+                        preview_pitches,
+                        translate=enable_translation,
+                        target_language=target_language
+                    ):
+                        cell = cells.get((variant.get('mood'), variant.get('pitch')))
+                        if cell is None:
+                            continue
+                        with cell.container():
+                            st.caption(variant['mood'])
+                            if variant.get('success'):
+                                st.audio(f"{BACKEND_URL}/api/audio/{variant['id']}", format="audio/mp3")
+                            else:
+                                st.warning(variant.get('error', 'Failed to generate variant'))
+        
         # Generate button
         if st.button("🎵 Generate Voice", type="primary"):
             if not text_input.strip():
@@ -336,33 +466,35 @@ def main():
                                     st.markdown("**Translated Text:**")
                                     st.write(result.get('translated_text'))
                             
-                            # Download and play audio
-                            audio_data = download_audio(audio_url)
+                            # Play audio (already in the generate response, fall back to a download)
+                            audio_file = result.get('audio_file') or download_audio(audio_url)
                             
-                            if audio_data:
+                            if audio_file:
                                 # Display audio player
-                                st.audio(audio_data, format="audio/mp3")
+                                st.audio(audio_file, format="audio/mp3")
                                 
                                 # Download button
-                                st.download_button(
-                                    label="📥 Download Audio",
-                                    data=audio_data,
-                                    file_name="generated_audio.mp3",
-                                    mime="audio/mp3"
-                                )
-                            # Shareable link + QR
+                                with open(audio_file, 'rb') as audio_data:
+                                    st.download_button(
+                                        label="📥 Download Audio",
+                                        data=audio_data,
+                                        file_name="generated_audio.mp3",
+                                        mime="audio/mp3"
+                                    )
+                            # Shareable link + QR (the backend's content-addressed URL is CDN-cacheable)
+                            share_url = f"{BACKEND_URL}/api/audio/{result['id']}" if result.get('id') else audio_url
                             st.markdown("### 🔗 Share")
                             
                             # Row for link and copy button
                             col1, col2 = st.columns([3, 1])
                             with col1:
-                                st.markdown(f"[Open generated audio link]({audio_url})")
+                                st.markdown(f"[Open generated audio link]({share_url})")
                             with col2:
-                                st_copy_to_clipboard(audio_url, "📋 Copy Link")
+                                st_copy_to_clipboard(share_url, "📋 Copy Link")
 
                             # Row for QR code
                             try:
-                                qr_png = generate_qr_png(audio_url, scale=4, border=2)
+                                qr_png = generate_qr_png(share_url, scale=4, border=2)
                                 st.image(
                                     qr_png, 
                                     caption="Right-click to copy image", 
@@ -388,4 +520,6 @@ def main():
     )
 
 if __name__ == "__main__":
-    main()
+    # One trace per Streamlit rerun, with the backend calls it makes as children
+    with tracer.start_as_current_span('streamlit.run'):
+        main()
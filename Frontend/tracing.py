@@ -0,0 +1,62 @@
+"""
+OpenTelemetry tracing for the Streamlit app.
+
+Each script run is a span and every backend call a child span whose context
+is sent in a traceparent header, so the backend's spans join the same trace.
+Exporting is configured like the backend's: OTEL_EXPORTER_OTLP_ENDPOINT for a
+collector, TRACE_FILE for a JSON-lines file. Without either, spans are no-ops.
+"""
+import os
+
+from opentelemetry import propagate, trace
+
+try:
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+except ImportError:
+    TracerProvider = None
+
+tracer = trace.get_tracer('murf-voice-frontend')
+
+
+def configure_tracing(service_name: str) -> bool:
+    """Install an exporting tracer provider once per process; True if spans are exported"""
+    if not isinstance(trace.get_tracer_provider(), trace.ProxyTracerProvider):
+        # Streamlit reruns the script in the same process
+        return True
+
+    endpoint = os.getenv('OTEL_EXPORTER_OTLP_ENDPOINT')
+    trace_file = os.getenv('TRACE_FILE')
+    if not (endpoint or trace_file) or TracerProvider is None:
+        return False
+
+    provider = TracerProvider(resource=Resource.create({'service.name': service_name}))
+    if endpoint:
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        except ImportError:
+            print("OTLP export needs opentelemetry-exporter-otlp-proto-http installed")
+        else:
+            provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    if trace_file:
+        exporter = ConsoleSpanExporter(
+            out=open(trace_file, 'a', encoding='utf-8'),
+            formatter=lambda span: span.to_json(indent=None) + '\n'
+        )
+        provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+    return True
+
+
+def trace_headers(headers=None, span=None) -> dict:
+    """Request headers carrying the current span's (or the given span's) trace context"""
+    headers = dict(headers or {})
+    context = trace.set_span_in_context(span) if span is not None else None
+    propagate.inject(headers, context=context)
+    return headers
+
+
+def client_span(name: str):
+    """Span around one backend call; send trace_headers() with the request made inside it"""
+    return tracer.start_as_current_span(name, kind=trace.SpanKind.CLIENT)